@@ -0,0 +1,72 @@
+"""Compare the threaded and asyncio download engines against the local stub server.
+
+    python bench/bench_engines.py --maps 200 --file-size 131072 --latency 0.05
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cnclabs.core import CnCLabsDownloader  # noqa: E402
+from cnclabs.async_core import AsyncCnCLabsDownloader  # noqa: E402
+from stub_server import StubConfig, start_server  # noqa: E402
+
+
+def make_maps(base_url: str, count: int) -> list:
+    return [{'Name': f"Bench Map {i}", 'Players': 8,
+             'DownloadUrl': f"{base_url}/maps/generals/zerohour/fetch.aspx?id={i}"} for i in range(count)]
+
+
+def run_threads(maps_list: list, download_dir: str, workers: int) -> int:
+    downloader = CnCLabsDownloader(download_dir=download_dir, max_workers=workers)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(downloader.download_map, maps_list))
+    return sum(1 for _, ok, _ in results if ok)
+
+
+def run_async(maps_list: list, download_dir: str, workers: int) -> int:
+    downloader = AsyncCnCLabsDownloader(download_dir=download_dir, max_workers=workers)
+    results = downloader.download_maps(maps_list)
+    return sum(1 for _, ok, _ in results if ok)
+
+
+def measure(name: str, fn, maps_list: list, workers: int, file_size: int):
+    download_dir = tempfile.mkdtemp(prefix='cnc-bench-')
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = fn(maps_list, download_dir, workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    mb = ok * file_size / (1024 * 1024)
+    print(f"{name:<8} workers={workers:<4} ok={ok:<5} {elapsed:7.2f}s  {ok / elapsed:8.1f} maps/s  {mb / elapsed:8.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Threaded vs asyncio engine benchmark")
+    parser.add_argument('--maps', type=int, default=200)
+    parser.add_argument('--file-size', type=int, default=128 * 1024)
+    parser.add_argument('--latency', type=float, default=0.05, help="Per-response server latency in seconds")
+    parser.add_argument('--workers', type=int, nargs='+', default=[10, 100])
+    args = parser.parse_args()
+
+    server, base_url = start_server(StubConfig(file_size=args.file_size, latency=args.latency))
+    maps_list = make_maps(base_url, args.maps)
+    try:
+        for workers in args.workers:
+            measure('threads', run_threads, maps_list, workers, args.file_size)
+            measure('async', run_async, maps_list, workers, args.file_size)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Listing-page parse micro-benchmark: BeautifulSoup tree vs. the streaming extractor.
+
+    python bench/bench_parser.py                      # bundled synthetic fixture
+    python bench/bench_parser.py saved_page1.html ... # pages saved from cnclabs.com
+"""
+import argparse
+import glob
+import gc
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cnclabs.listingparser import extract_map_links_lxml, extract_map_links_stdlib  # noqa: E402
+
+try:
+    import bs4
+except ImportError:
+    bs4 = None
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', '*.html')
+
+# Top-level nodes before <html> that the pull parser keeps as siblings of the root
+PROLOGUES = {
+    'leading-comment': '<!-- generated by the CMS -->\n',
+    'xml-declaration': '<?xml version="1.0" encoding="utf-8"?>\n',
+}
+
+
+def bs4_links(html: str) -> list:
+    # What get_maps_urls used to do, keeping the live Tag objects
+    soup = bs4.BeautifulSoup(html, 'lxml')
+    return soup.find_all('a', class_='DisplayName')
+
+
+def measure(name: str, fn, pages: list, rounds: int):
+    fn(pages[0])
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            fn(html)
+    elapsed = time.perf_counter() - start
+    # Memory still held by one page's result (live Tags keep the whole tree)
+    tracemalloc.start()
+    result = fn(pages[0])
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_page = elapsed / (rounds * len(pages)) * 1000
+    print(f"{name:<10} {per_page:8.3f} ms/page  {rounds * len(pages) / elapsed:8.1f} pages/s  "
+          f"links={len(result):<4} retained={retained / 1024:8.1f} KiB")
+
+
+def with_prologues(paths: list, pages: list) -> list:
+    """``(label, html)`` for every page plus its variants with a comment or XML declaration first."""
+    cases = list(zip(paths, pages))
+    for path, html in zip(paths, pages):
+        body = re.sub(r'^\s*<!DOCTYPE[^>]*>\s*', '', html, flags=re.IGNORECASE)
+        for kind, prologue in PROLOGUES.items():
+            cases.append((f"{path} [{kind}]", prologue + html))
+            cases.append((f"{path} [{kind}, no doctype]", prologue + body))
+    return cases
+
+
+def check(cases: list) -> bool:
+    # Both extractors must return the same links, or the timings compare different work
+    ok = True
+    for label, html in cases:
+        try:
+            lxml_links = extract_map_links_lxml(html)
+        except Exception as e:
+            print(f"{label}: lxml-pull raised {type(e).__name__}: {e}")
+            ok = False
+            continue
+        stdlib_links = extract_map_links_stdlib(html)
+        if lxml_links != stdlib_links:
+            print(f"{label}: lxml-pull found {len(lxml_links)} links, stdlib {len(stdlib_links)}")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Listing page parser benchmark")
+    parser.add_argument('pages', nargs='*', help="Saved listing pages (default: bench/fixtures/*.html)")
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(glob.glob(FIXTURES))
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            pages.append(f.read())
+    print(f"{len(pages)} page(s), {sum(len(p) for p in pages) / len(pages) / 1024:.1f} KiB average")
+    if not check(with_prologues(paths, pages)):
+        sys.exit("extractors disagree, not benchmarking")
+
+    if bs4 is not None:
+        measure('bs4+lxml', bs4_links, pages, args.rounds)
+    measure('lxml-pull', extract_map_links_lxml, pages, args.rounds)
+    measure('stdlib', extract_map_links_stdlib, pages, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Simulate a rate-limited CNC Labs and compare fixed workers with the adaptive limiter.
+
+    python bench/bench_ratelimit.py --maps 150 --rate-limit 40 --workers 10
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cnclabs.core import CnCLabsDownloader  # noqa: E402
+from stub_server import StubConfig, start_server  # noqa: E402
+from bench_engines import make_maps  # noqa: E402
+
+
+def run(adaptive: bool, args) -> None:
+    config = StubConfig(file_size=args.file_size, latency=args.latency, rate_limit=args.rate_limit,
+                        burst=args.burst, retry_after=args.retry_after)
+    server, base_url = start_server(config)
+    download_dir = tempfile.mkdtemp(prefix='cnc-bench-')
+    try:
+        downloader = CnCLabsDownloader(download_dir=download_dir, max_workers=args.workers, adaptive=adaptive,
+                                       max_concurrency=args.max_concurrency if adaptive else None)
+        maps_list = make_maps(base_url, args.maps)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Same worker loop as download_all_maps, fed from a fixed list
+            with concurrent.futures.ThreadPoolExecutor(max_workers=downloader.pool_size) as executor:
+                def work(m):
+                    with downloader.request_slot():
+                        return downloader.download_map(m)
+                results = list(executor.map(work, maps_list))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        shutil.rmtree(download_dir, ignore_errors=True)
+    ok = sum(1 for _, success, _ in results if success)
+    limit = downloader.limiter.current if downloader.limiter else args.workers
+    print(f"{'adaptive' if adaptive else 'fixed':<9} ok={ok:<5} {elapsed:7.2f}s  {ok / elapsed:7.1f} maps/s  "
+          f"429s={config.rejected:<5} final limit={limit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive concurrency simulation")
+    parser.add_argument('--maps', type=int, default=150)
+    parser.add_argument('--file-size', type=int, default=64 * 1024)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=float, default=40, help="Server requests per second")
+    parser.add_argument('--burst', type=int, default=10)
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--max-concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    for adaptive in (False, True):
+        run(adaptive, args)
+
+
+if __name__ == "__main__":
+    main()
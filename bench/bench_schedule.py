@@ -0,0 +1,86 @@
+"""Download order benchmark: time to the first finished map, mean completion time and makespan.
+
+    python bench/bench_schedule.py --maps 60 --workers 4 --size-spread 30 --bandwidth 2048
+    python bench/bench_schedule.py --orders page smallest --probe      # sizes from HEAD probes
+
+The stub serves archives of very different sizes (--file-size up to (1 + --size-spread) times it)
+at a per-connection --bandwidth, so a few large archives early in the list hold their workers for
+a long time. Every order downloads the same map list into a fresh directory. Without --probe the
+sizes are given up front, as a manifest or the catalog would.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cnclabs.core import CnCLabsDownloader  # noqa: E402
+from cnclabs.mapqueue import ORDERS  # noqa: E402
+from stub_server import StubConfig, start_server  # noqa: E402
+from bench_engines import make_maps  # noqa: E402
+
+
+def run_order(order: str, maps_list: list, workers: int, probe: bool) -> dict:
+    download_dir = tempfile.mkdtemp(prefix='cnc-schedule-')
+    downloader = CnCLabsDownloader(download_dir=download_dir, max_workers=workers, adaptive=False,
+                                   verify='off', order=order, probe_sizes=probe)
+    finished = []
+    download_map = downloader.download_map
+
+    def timed_download(m):
+        result = download_map(m)
+        finished.append(time.perf_counter() - start)
+        return result
+    downloader.download_map = timed_download
+    try:
+        start = time.perf_counter()
+        selected = downloader.select_maps(maps_list)
+        probed = time.perf_counter() - start
+        downloader.download_maps(selected)
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    return {'order': order, 'maps': len(finished), 'probe': probed, 'first': min(finished),
+            'mean': statistics.mean(finished), 'half': sorted(finished)[len(finished) // 2 - 1],
+            'makespan': max(finished)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare download orders against the local stub")
+    parser.add_argument('--maps', type=int, default=60)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--orders', nargs='+', choices=[o for o in ORDERS if o != 'newest'],
+                        default=['page', 'smallest', 'eta'])
+    parser.add_argument('--file-size', type=int, default=64 * 1024, help="Smallest archive in bytes")
+    parser.add_argument('--size-spread', type=float, default=30, help="Largest archive is (1 + this) * --file-size")
+    parser.add_argument('--bandwidth', type=float, default=2048, help="Per-connection send rate in KB/s")
+    parser.add_argument('--probe', action='store_true', help="Learn the sizes from HEAD probes instead of the list")
+    args = parser.parse_args()
+
+    config = StubConfig(file_size=args.file_size, size_spread=args.size_spread, bandwidth=args.bandwidth * 1024)
+    server, base_url = start_server(config)
+    maps_list = make_maps(base_url, args.maps)
+    ids = [m['DownloadUrl'].rsplit('=', 1)[1] for m in maps_list]
+    # Build every archive before the first run, so no order pays for it
+    for map_id in ids:
+        config.archive(map_id)
+    if not args.probe:
+        for m, map_id in zip(maps_list, ids):
+            m['ProbedSize'] = config.archive_size(map_id)
+    total_mb = sum(config.archive_size(map_id) for map_id in ids) / (1024 * 1024)
+    print(f"{args.maps} maps, {total_mb:.1f} MB, {args.workers} workers at {args.bandwidth:g} KB/s each")
+    print(f"{'order':<10} {'probe':>8} {'first':>8} {'half':>8} {'mean':>8} {'makespan':>9}")
+    try:
+        for order in args.orders:
+            r = run_order(order, maps_list, args.workers, args.probe)
+            print(f"{r['order']:<10} {r['probe']:7.2f}s {r['first']:7.2f}s {r['half']:7.2f}s {r['mean']:7.2f}s "
+                  f"{r['makespan']:8.2f}s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Startup-time benchmark for the front ends (what a cron job pays before any work starts).
+
+    python bench/bench_startup.py                       # wall time of each command + import breakdown
+    python bench/bench_startup.py --top 15 --runs 20
+    python bench/bench_startup.py --budget-ms 150       # exit 1 if the CLI's --help is slower than this
+
+Each command runs in a fresh interpreter. Wall time is the median over --runs. The import
+breakdown comes from ``python -X importtime``: the self and cumulative microseconds of every
+module, of which the slowest imports of the top two levels are listed.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# label -> interpreter arguments
+COMMANDS = {
+    'python (baseline)': ['-c', 'pass'],
+    'cnclabsCLI --help': [os.path.join(ROOT, 'cnclabsCLI.py'), '--help'],
+    'import cnclabs.core': ['-c', 'import cnclabs.core'],
+    'import cnclabs.async_core': ['-c', 'import cnclabs.async_core'],
+    'import cncgui': ['-c', 'import cncgui'],
+    'import cnclabs_daemon': ['-c', 'import cnclabs_daemon'],
+}
+
+
+def wall_times(args: list, runs: int) -> list:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True)
+        times.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.decode(errors='replace').strip().splitlines()[-1])
+    return times
+
+
+def import_breakdown(args: list) -> list:
+    """[(cumulative us, self us, module)] for the top two levels of imports of one run."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented two spaces per level; keep top-level imports and their direct children
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if depth <= 1:
+            rows.append((int(cumulative_us), int(self_us), '  ' * depth + name.strip()))
+    return sorted(rows, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Front-end startup benchmark")
+    parser.add_argument('--runs', type=int, default=10, help="Interpreter starts per command")
+    parser.add_argument('--top', type=int, default=10, help="Slowest imports to list per command")
+    parser.add_argument('--only', nargs='+', choices=list(COMMANDS), default=None, help="Commands to measure")
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="Fail if the median time of 'cnclabsCLI --help' exceeds this")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'command':<24} {'median':>9} {'min':>9} {'max':>9}")
+    for label in args.only or COMMANDS:
+        try:
+            times = wall_times(COMMANDS[label], args.runs)
+        except RuntimeError as e:
+            # e.g. tkinter or aiohttp missing on this machine
+            print(f"{label:<24} skipped: {e}")
+            continue
+        results[label] = statistics.median(times)
+        print(f"{label:<24} {results[label] * 1000:8.1f}ms {min(times) * 1000:8.1f}ms {max(times) * 1000:8.1f}ms")
+
+    for label in results:
+        if label == 'python (baseline)':
+            continue
+        print(f"\n{label}: slowest imports (cumulative / self)")
+        for cumulative_us, self_us, name in import_breakdown(COMMANDS[label])[:args.top]:
+            print(f"  {cumulative_us / 1000:7.1f}ms {self_us / 1000:7.1f}ms  {name}")
+
+    cli = results.get('cnclabsCLI --help')
+    if args.budget_ms is not None and cli is not None and cli * 1000 > args.budget_ms:
+        print(f"\n'cnclabsCLI --help' took {cli * 1000:.1f}ms, over the {args.budget_ms:g}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Reproducible download benchmark: maps/s, MB/s, per-map p50/p99 latency and peak RSS per worker count.
+
+    python bench/bench_suite.py --maps 200 --workers 1 5 20 --latency 0.05 --error-rate 0.02
+    python bench/bench_suite.py --base-url http://127.0.0.1:8765 --file-size 262144   # external stub
+
+Each (engine, workers) run happens in a fresh subprocess so peak RSS is that run's own. Without
+--base-url a local stub server is started with the given file size, latency, bandwidth cap and
+429/503 injection; with --base-url the stub (or any compatible server) is used as is.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubConfig, start_server  # noqa: E402
+from bench_engines import make_maps  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def run_child(spec: dict) -> dict:
+    """One measured run; executed inside the subprocess."""
+    maps_list = make_maps(spec['base_url'], spec['maps'])
+    download_dir = tempfile.mkdtemp(prefix='cnc-bench-')
+    latencies = []
+    results = []
+    options = dict(download_dir=download_dir, max_workers=spec['workers'], adaptive=spec['adaptive'],
+                   base_url=spec['base_url'])
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if spec['engine'] == 'async':
+                from cnclabs.async_core import AsyncCnCLabsDownloader
+                downloader = AsyncCnCLabsDownloader(**options)
+                fetch_map = downloader.fetch_map
+
+                async def timed_fetch(m):
+                    began = time.perf_counter()
+                    result = await fetch_map(m)
+                    latencies.append(time.perf_counter() - began)
+                    return result
+                downloader.fetch_map = timed_fetch
+                results = asyncio.run(downloader.run(maps_list))
+            else:
+                from cnclabs.core import CnCLabsDownloader
+                downloader = CnCLabsDownloader(segments=spec['segments'], **options)
+                download_map = downloader.download_map
+
+                def timed_download(m):
+                    began = time.perf_counter()
+                    result = download_map(m)
+                    latencies.append(time.perf_counter() - began)
+                    results.append(result)
+                    return result
+                downloader.download_map = timed_download
+
+                def produce(jobs):
+                    for m in maps_list:
+                        jobs.put(m)
+                downloader.run_jobs(produce)
+            elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    metrics = downloader.metrics
+    ok = sum(1 for _, success, _ in results if success)
+    return {
+        'engine': spec['engine'], 'workers': spec['workers'], 'ok': ok, 'failed': len(results) - ok,
+        'elapsed': elapsed, 'maps_per_s': ok / elapsed, 'mb_per_s': metrics.bytes.total() / (1024 * 1024) / elapsed,
+        'p50': percentile(latencies, 0.50), 'p99': percentile(latencies, 0.99),
+        'retries': {values[0]: child.value for values, child in metrics.retries._children.items()},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_isolated(spec: dict) -> dict:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(spec)],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def report(r: dict):
+    rss = f"{r['peak_rss_mb']:7.1f} MB" if r['peak_rss_mb'] is not None else "    n/a   "
+    retries = ' '.join(f"{k}={int(v)}" for k, v in sorted(r['retries'].items())) or '-'
+    print(f"{r['engine']:<8} {r['workers']:>5} {r['ok']:>5} {r['failed']:>5} {r['elapsed']:8.2f}s "
+          f"{r['maps_per_s']:8.1f} {r['mb_per_s']:8.1f} {r['p50'] * 1000:8.1f} {r['p99'] * 1000:8.1f} {rss}  {retries}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline download benchmark against a local CNC Labs stub")
+    parser.add_argument('--child', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', type=str, default=None,
+                        help="Use an already running stub instead of starting one (stub options are then ignored)")
+    parser.add_argument('--engines', nargs='+', choices=('threads', 'async'), default=['threads', 'async'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--maps', type=int, default=100)
+    parser.add_argument('--segments', type=int, default=1, help="Threads engine: connections per archive")
+    parser.add_argument('--no-adaptive', action='store_true', help="Fixed worker count instead of the AIMD limiter")
+    parser.add_argument('--file-size', type=int, default=256 * 1024, help="Archive size in bytes")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds before each response")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="Per-response send rate in KB/s (0 = unlimited)")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Requests per second before 429s")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--json', type=str, default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        config = StubConfig(file_size=args.file_size, latency=args.latency, rate_limit=args.rate_limit,
+                            bandwidth=args.bandwidth * 1024, error_rate=args.error_rate)
+        server, base_url = start_server(config)
+    print(f"{'engine':<8} {'wrk':>5} {'ok':>5} {'fail':>5} {'elapsed':>9} {'maps/s':>8} {'MB/s':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'peak RSS':>10}  retries")
+    results = []
+    try:
+        for workers in args.workers:
+            for engine in args.engines:
+                spec = {'engine': engine, 'workers': workers, 'maps': args.maps, 'base_url': base_url,
+                        'segments': args.segments, 'adaptive': not args.no_adaptive}
+                result = run_isolated(spec)
+                results.append(result)
+                report(result)
+    finally:
+        if server is not None:
+            server.shutdown()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
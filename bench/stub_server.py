@@ -0,0 +1,249 @@
+"""Local stand-in for cnclabs.com used by the offline benchmarks.
+
+Serves synthetic zerohour-maps.aspx listing pages, details.aspx pages and fetch.aspx archives so
+the downloader engines can be measured without touching the real site.
+"""
+import argparse
+import datetime
+import hashlib
+import io
+import http.server
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from urllib.parse import urlparse, parse_qs
+
+
+class StubConfig:
+    def __init__(self, pages: int = 5, maps_per_page: int = 20, file_size: int = 256 * 1024,
+                 latency: float = 0.0, ranges: bool = True, rate_limit: float = 0.0, burst: int = 10,
+                 retry_after: float = 1.0, bandwidth: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 size_spread: float = 0.0):
+        self.pages = pages
+        self.maps_per_page = maps_per_page
+        self.file_size = file_size
+        self.latency = latency
+        self.ranges = ranges
+        # Token bucket shared by all connections; 0 disables rate limiting
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.retry_after = retry_after
+        # Per-response send rate in bytes/s (0 = unlimited) and share of requests answered with a 503
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.errors = 0
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+        self.payload = self.make_archive(file_size)
+        self.payload_etag = '"' + hashlib.md5(self.payload).hexdigest() + '"'
+        # Archive sizes vary per map between file_size and file_size * (1 + size_spread)
+        self.size_spread = size_spread
+        self.archives = {}
+
+    def archive_size(self, map_id: str) -> int:
+        if not self.size_spread:
+            return self.file_size
+        return int(self.file_size * (1 + self.size_spread * (zlib.crc32(map_id.encode()) % 1000) / 999))
+
+    # (payload, ETag) of one map's archive; one archive per distinct size
+    def archive(self, map_id: str) -> tuple:
+        if not self.size_spread:
+            return self.payload, self.payload_etag
+        size = self.archive_size(map_id)
+        with self.lock:
+            if size not in self.archives:
+                payload = self.make_archive(size)
+                self.archives[size] = (payload, '"' + hashlib.md5(payload).hexdigest() + '"')
+            return self.archives[size]
+
+
+    # A real (stored) zip so the downloader's archive validation passes
+    @staticmethod
+    def make_archive(size: int) -> bytes:
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_STORED) as zf:
+            zf.writestr('map.map', os.urandom(max(0, size - 200)))
+        return buf.getvalue()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate_limit)
+                self.refilled_at = now
+                if self.tokens < 1:
+                    self.rejected += 1
+                    return False
+                self.tokens -= 1
+            self.served += 1
+            return True
+
+    def inject_error(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self.lock:
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = StubConfig()
+    LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body: bytes, content_type: str = 'application/octet-stream', status: int = 200,
+                  headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        if not self.config.bandwidth:
+            self.wfile.write(body)
+            return
+        # Paced in 16 KiB writes so a slow link looks slow from the first byte
+        chunk = 16 * 1024
+        for start in range(0, len(body), chunk):
+            self.wfile.write(body[start:start + chunk])
+            time.sleep(len(body[start:start + chunk]) / self.config.bandwidth)
+
+    def listing_page(self, page: int, players: int) -> bytes:
+        links = []
+        if page <= self.config.pages:
+            for i in range(self.config.maps_per_page):
+                map_id = f"{players}{page:04d}{i:03d}"
+                links.append(f'<tr><td><a class="DisplayName" href="/maps/generals/zerohour/details.aspx?id={map_id}">'
+                             f'Stub Map {players}P {page}-{i}</a></td></tr>')
+        return f"<html><body><table>{''.join(links)}</table></body></html>".encode()
+
+    # Deterministic metadata per map so details-page filters can be exercised
+    def details_page(self, map_id: str) -> bytes:
+        n = zlib.crc32(map_id.encode())
+        uploaded = datetime.date(2010, 1, 1) + datetime.timedelta(days=n % 5000)
+        return (f'<html><head><meta property="og:image" content="/images/maps/{map_id}.jpg"></head><body>'
+                f'<h1>Stub Map {map_id}</h1><table>'
+                f'<tr><td>Author:</td><td><span id="ctl00_Main_lblAuthor">Mapper {n % 7}</span></td></tr>'
+                f'<tr><td>Rating:</td><td><span id="ctl00_Main_lblRating">{n % 51 / 10:.1f}</span> / 5</td></tr>'
+                f'<tr><td>Date Added:</td><td><span id="ctl00_Main_lblDateAdded">'
+                f'{uploaded.month}/{uploaded.day}/{uploaded.year} 3:15:00 PM</span></td></tr>'
+                f'<tr><td>File Size:</td><td><span id="ctl00_Main_lblFileSize">'
+                f'{self.config.archive_size(map_id) / 1024:.1f} KB</span></td></tr></table>'
+                f'<div id="ctl00_Main_lblDescription">A generated map for offline tests.</div>'
+                f'</body></html>').encode()
+
+    def send_archive(self, map_id: str):
+        payload, etag = self.config.archive(map_id)
+        headers = {'ETag': etag, 'Last-Modified': self.LAST_MODIFIED}
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if not (self.config.ranges and match) or (if_range and if_range != etag):
+            if self.config.ranges:
+                headers['Accept-Ranges'] = 'bytes'
+            self.send_body(payload, headers=headers)
+            return
+        start = int(match.group(1))
+        end = min(int(match.group(2)), len(payload) - 1) if match.group(2) else len(payload) - 1
+        if start >= len(payload) or end < start:
+            headers['Content-Range'] = f'bytes */{len(payload)}'
+            self.send_body(b'', status=416, headers=headers)
+            return
+        headers['Content-Range'] = f'bytes {start}-{end}/{len(payload)}'
+        self.send_body(payload[start:end + 1], status=206, headers=headers)
+
+    def do_GET(self):
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        if not self.config.allow():
+            headers = {'Retry-After': f"{self.config.retry_after:g}"} if self.config.retry_after else None
+            self.send_body(b'Too Many Requests', 'text/plain', 429, headers=headers)
+            return
+        if self.config.inject_error():
+            self.send_body(b'Service Unavailable', 'text/plain', 503)
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.endswith('zerohour-maps.aspx'):
+            page = int(query.get('page', ['1'])[0])
+            players = int(query.get('players', ['8'])[0])
+            body = self.listing_page(page, players)
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_body(body, 'text/html; charset=utf-8', headers={'ETag': etag, 'Last-Modified': self.LAST_MODIFIED})
+        elif url.path.endswith('details.aspx'):
+            self.send_body(self.details_page(query.get('id', [''])[0]), 'text/html; charset=utf-8')
+        elif re.search(r'/fetch\.aspx$', url.path):
+            self.send_archive(query.get('id', [''])[0])
+        else:
+            self.send_body(b'not found', 'text/plain', 404)
+
+
+    # Same routes and headers as GET, without the body (size probes)
+    do_HEAD = do_GET
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    # Clients drop connections on purpose (probe-then-close, cancelled downloads)
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_server(config: StubConfig, host: str = '127.0.0.1', port: int = 0):
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config})
+    server = StubServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local CNC Labs stub server")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--maps-per-page', type=int, default=20)
+    parser.add_argument('--file-size', type=int, default=256 * 1024, help="Archive size in bytes")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Requests per second before answering 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds sent with 429s (0 = omit)")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="Per-response send rate in KB/s (0 = unlimited)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--size-spread', type=float, default=0.0,
+                        help="Vary archive sizes per map from --file-size up to (1 + this) times it")
+    args = parser.parse_args()
+
+    config = StubConfig(args.pages, args.maps_per_page, args.file_size, args.latency,
+                        rate_limit=args.rate_limit, retry_after=args.retry_after,
+                        bandwidth=args.bandwidth * 1024, error_rate=args.error_rate, size_spread=args.size_spread)
+    server, base_url = start_server(config, port=args.port)
+    print(f"Serving stub CNC Labs on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,186 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
 import threading
-import requests
-import bs4
 import os
-import time
-import re
-import random
-import concurrent.futures
-from random import choice
-from PIL import Image, ImageTk
-import base64
-from io import BytesIO
-
-
-class CnCLabsDownloader:
-    BASE_URL = 'https://www.cnclabs.com'
-    USER_AGENTS = [
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu Chromium/37.0.2062.94 Chrome/37.0.2062.94 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/45.0.2454.85 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko',
-        'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:40.0) Gecko/20100101 Firefox/40.0'
-    ]
-
-    def __init__(self, players: int = 8, max_pages: int = 10, download_dir: str = "downloads", max_workers: int = 3,
-                 log_callback=None, progress_callback=None):
-        self.players = players
-        self.max_pages = max_pages
-        self.download_dir = download_dir
-        self.max_workers = max_workers
-        self.log_callback = log_callback
-        self.progress_callback = progress_callback
-        self.is_running = False
-        os.makedirs(self.download_dir, exist_ok=True)
-        self.session = requests.Session()
-
-    def request_with_backoff(self, url: str, max_attempts: int = 5, **kwargs):
-        attempt = 0
-        last_exc = None
-        while attempt < max_attempts:
-            attempt += 1
-            try:
-                self.session.headers.update({'user-agent': choice(self.USER_AGENTS)})
-                resp = self.session.get(url, **kwargs)
-                if resp.status_code == 429:
-                    backoff_factor = min(60, (2 ** attempt) + random.uniform(0, 1.5))
-                    if self.log_callback:
-                        self.log_callback(f"[429] Waiting {backoff_factor:.1f}s (attempt {attempt})", "warning")
-                    time.sleep(backoff_factor)
-                    last_exc = Exception("429")
-                    continue
-                if 500 <= resp.status_code < 600:
-                    backoff_factor = min(60, (2 ** attempt) + random.uniform(0, 1.5))
-                    if self.log_callback:
-                        self.log_callback(f"[{resp.status_code}] Server error. Waiting {backoff_factor:.1f}s", "warning")
-                    time.sleep(backoff_factor)
-                    last_exc = Exception(str(resp.status_code))
-                    continue
-                return resp
-            except requests.RequestException as e:
-                last_exc = e
-                backoff_factor = min(60, (2 ** attempt) + random.uniform(0, 1.5))
-                if self.log_callback:
-                    self.log_callback(f"Request exception: {e}. Retrying in {backoff_factor:.1f}s", "warning")
-                time.sleep(backoff_factor)
-        raise last_exc if last_exc else Exception("Request failed")
-
-    @staticmethod
-    def get_maps_urls(html_content: str):
-        soup = bs4.BeautifulSoup(html_content, 'lxml')
-        elements = soup.find_all('a', class_='DisplayName')
-        return elements if elements else []
-
-    @staticmethod
-    def sanitize_filename(name: str) -> str:
-        name = re.sub(r'[\\/:"*?<>|]+', '_', name).strip()
-        return name[:200] if len(name) > 200 else name
-
-    def download_map(self, map_info: dict) -> tuple[str, bool, str]:
-        if not self.is_running:
-            return (map_info['Name'], False, "Stopped by user")
-            
-        map_name = map_info['Name']
-        map_url = map_info['DownloadUrl']
-        filename = self.sanitize_filename(map_name) + '.zip'
-        target_path = os.path.join(self.download_dir, filename)
-        
-        if os.path.exists(target_path):
-            msg = f"Skipped (exists)"
-            if self.log_callback:
-                self.log_callback(f"[SKIP] {map_name}", "warning")
-            return (map_name, True, msg)
-        
-        try:
-            r = self.request_with_backoff(map_url, stream=True)
-            total_size = int(r.headers.get('Content-Length', 0) or 0)
-            downloaded = 0
-            
-            with open(target_path + '.part', 'wb') as f:
-                for chunk in r.iter_content(8192):
-                    if not self.is_running:
-                        os.remove(target_path + '.part')
-                        return (map_name, False, "Stopped by user")
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if self.progress_callback and total_size > 0:
-                            percent = min(100, downloaded * 100 / total_size)
-                            self.progress_callback(map_name, percent)
-            
-            os.replace(target_path + '.part', target_path)
-            msg = f"Downloaded successfully"
-            if self.log_callback:
-                self.log_callback(f"[OK] {map_name}", "success")
-            return (map_name, True, target_path)
-        except Exception as e:
-            if self.log_callback:
-                self.log_callback(f"[ERROR] {map_name}: {str(e)}", "error")
-            return (map_name, False, str(e))
-
-    def download_all_maps(self):
-        self.is_running = True
-        page = 1
-        total_downloaded = 0
-        
-        while page <= self.max_pages and self.is_running:
-            url = f"{self.BASE_URL}/maps/generals/zerohour-maps.aspx?page={page}&players={self.players}"
-            try:
-                if self.log_callback:
-                    self.log_callback(f"[INFO] Processing page {page}/{self.max_pages}", "info")
-                
-                resp = self.request_with_backoff(url)
-                elements = self.get_maps_urls(resp.text)
-                
-                if elements:
-                    maps_list = []
-                    for e in elements:
-                        maps_list.append({
-                            'Name': e.get_text(),
-                            'Players': self.players,
-                            'DownloadUrl': self.BASE_URL + e['href'].replace('details', 'fetch')
-                        })
-                    
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                        futures = [executor.submit(self.download_map, m) for m in maps_list]
-                        for fut in concurrent.futures.as_completed(futures):
-                            if not self.is_running:
-                                break
-                            name, ok, msg = fut.result()
-                            if ok:
-                                total_downloaded += 1
-                else:
-                    if self.log_callback:
-                        self.log_callback(f"[INFO] No maps found on page {page}", "info")
-                        
-            except Exception as e:
-                if self.log_callback:
-                    self.log_callback(f"[ERROR] Page {page}: {e}", "error")
-            
-            page += 1
-            if self.is_running and page <= self.max_pages:
-                time.sleep(random.uniform(2, 5))
-        
-        if self.log_callback:
-            if self.is_running:
-                self.log_callback(f"\n[DONE] Download completed! Total maps: {total_downloaded}", "success")
-            else:
-                self.log_callback(f"\n[STOPPED] Process stopped by user. Downloaded: {total_downloaded}", "warning")
-        
-        self.is_running = False
-
-    def stop(self):
-        self.is_running = False
+from cnclabs.bandwidth import BandwidthLimiter, format_rate
+from cnclabs.core import CnCLabsDownloader
+from cnclabs.mapcatalog import MapCatalog
+from cnclabs.crawlplan import parse_int_ranges
+from cnclabs.pagecache import PageCache
+from eventbus import EventBus
+from logview import LogView
+from cnclabs.journal import CrawlJournal
 
 
 class CnCLabsGUI:
+    # UI refresh interval for queued log/progress events (~15 Hz)
+    EVENT_POLL_MS = 66
+    # Lines kept in the log widget; the optional log file gets everything
+    LOG_MAX_LINES = 2000
+    
     def load_icon(self):
         """Load the icon image - tries to find icon.png in the same directory"""
         try:
             # Try to load icon from file
             icon_path = os.path.join(os.path.dirname(__file__), "icon.png")
             if os.path.exists(icon_path):
+                from PIL import Image, ImageTk
                 img = Image.open(icon_path)
                 img = img.resize((70, 70), Image.LANCZOS)
                 self.icon_image = ImageTk.PhotoImage(img)
@@ -211,9 +55,17 @@ class CnCLabsGUI:
         self.downloader = None
         self.download_thread = None
         self.icon_image = None
+        # Worker threads never touch widgets; they post to this bus and pump_events applies it
+        self.events = EventBus()
+        self.active_maps = {}
+        # Last whole percent reported per map, so per-chunk progress doesn't flood the bus
+        self.progress_seen = {}
+        # One limiter for the whole session, so a new limit applies to a download that is already running
+        self.bandwidth = BandwidthLimiter(on_change=self.on_bandwidth_change)
         
         self.load_icon()
         self.setup_ui()
+        self.root.after(self.EVENT_POLL_MS, self.pump_events)
         
     def load_icon(self):
         """Load the icon image - tries to find icon.png in the same directory"""
@@ -221,6 +73,8 @@ class CnCLabsGUI:
             # Try to load icon from file
             icon_path = os.path.join(os.path.dirname(__file__), "icon.jpg")
             if os.path.exists(icon_path):
+                # Pillow is only loaded when there is an icon to show
+                from PIL import Image, ImageTk
                 img = Image.open(icon_path)
                 img = img.resize((70, 70), Image.LANCZOS)
                 self.icon_image = ImageTk.PhotoImage(img)
@@ -305,13 +159,14 @@ class CnCLabsGUI:
         # Players
         tk.Label(
             settings_inner,
-            text="Number of Players:",
+            text="Players (8, 2,4 or 2-8):",
             bg=self.bg_light,
             fg=self.text_white,
             font=("Arial", 10, "bold")
         ).grid(row=0, column=0, sticky=tk.W, padx=8, pady=6)
         
-        self.players_var = tk.IntVar(value=8)
+        # StringVar so a list or range can be typed; the arrows still step single counts
+        self.players_var = tk.StringVar(value="8")
         players_spinbox = tk.Spinbox(
             settings_inner,
             from_=2,
@@ -377,6 +232,111 @@ class CnCLabsGUI:
         )
         workers_spinbox.grid(row=1, column=1, padx=8, pady=6)
         
+        # Incremental crawl against the map catalog
+        self.incremental_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            settings_inner,
+            text="Only New Maps (stop at known pages)",
+            variable=self.incremental_var,
+            bg=self.bg_light,
+            fg=self.text_white,
+            selectcolor=self.bg_dark,
+            activebackground=self.bg_light,
+            activeforeground=self.accent_light,
+            font=("Arial", 10, "bold")
+        ).grid(row=1, column=2, columnspan=2, sticky=tk.W, padx=8, pady=6)
+        
+        # Segmented downloads for large archives
+        tk.Label(
+            settings_inner,
+            text="Connections per Map:",
+            bg=self.bg_light,
+            fg=self.text_white,
+            font=("Arial", 10, "bold")
+        ).grid(row=2, column=0, sticky=tk.W, padx=8, pady=6)
+        
+        self.segments_var = tk.IntVar(value=1)
+        segments_spinbox = tk.Spinbox(
+            settings_inner,
+            from_=1,
+            to=8,
+            textvariable=self.segments_var,
+            width=12,
+            font=("Arial", 10, "bold"),
+            bg=self.bg_dark,
+            fg=self.accent_light,
+            buttonbackground=self.accent_bright,
+            relief=tk.SUNKEN,
+            bd=2
+        )
+        segments_spinbox.grid(row=2, column=1, padx=8, pady=6)
+        
+        # Content-hash dedup of re-uploaded maps
+        self.dedup_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            settings_inner,
+            text="Link Identical Maps (save disk)",
+            variable=self.dedup_var,
+            bg=self.bg_light,
+            fg=self.text_white,
+            selectcolor=self.bg_dark,
+            activebackground=self.bg_light,
+            activeforeground=self.accent_light,
+            font=("Arial", 10, "bold")
+        ).grid(row=2, column=2, columnspan=2, sticky=tk.W, padx=8, pady=6)
+        
+        # Continue a crawl that was stopped or crashed, using <dir>/crawl.journal
+        self.resume_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            settings_inner,
+            text="Resume Interrupted Crawl",
+            variable=self.resume_var,
+            bg=self.bg_light,
+            fg=self.text_white,
+            selectcolor=self.bg_dark,
+            activebackground=self.bg_light,
+            activeforeground=self.accent_light,
+            font=("Arial", 10, "bold")
+        ).grid(row=3, column=0, columnspan=2, sticky=tk.W, padx=8, pady=6)
+        
+        # Bandwidth limit: a rate (512K, 2M, 0 = unlimited) or a schedule (08:00-18:00=512K,*=0)
+        tk.Label(
+            settings_inner,
+            text="Bandwidth Limit:",
+            bg=self.bg_light,
+            fg=self.text_white,
+            font=("Arial", 10, "bold")
+        ).grid(row=3, column=2, sticky=tk.W, padx=8, pady=6)
+        
+        rate_frame = tk.Frame(settings_inner, bg=self.bg_light)
+        rate_frame.grid(row=3, column=3, sticky=tk.W, padx=8, pady=6)
+        
+        self.rate_var = tk.StringVar(value="0")
+        rate_entry = tk.Entry(
+            rate_frame,
+            textvariable=self.rate_var,
+            font=("Arial", 10),
+            bg=self.bg_dark,
+            fg=self.accent_light,
+            width=10,
+            relief=tk.SUNKEN,
+            bd=2
+        )
+        rate_entry.pack(side=tk.LEFT, padx=(0, 8))
+        rate_entry.bind("<Return>", lambda event: self.apply_bandwidth())
+        
+        tk.Button(
+            rate_frame,
+            text="Apply",
+            command=self.apply_bandwidth,
+            bg=self.accent_bright,
+            fg=self.text_white,
+            font=("Arial", 9, "bold"),
+            relief=tk.RAISED,
+            bd=3,
+            activebackground=self.accent_light
+        ).pack(side=tk.LEFT)
+        
         # Download Directory
         tk.Label(
             settings_inner,
@@ -384,10 +344,10 @@ class CnCLabsGUI:
             bg=self.bg_light,
             fg=self.text_white,
             font=("Arial", 10, "bold")
-        ).grid(row=2, column=0, sticky=tk.W, padx=8, pady=6)
+        ).grid(row=4, column=0, sticky=tk.W, padx=8, pady=6)
         
         dir_frame = tk.Frame(settings_inner, bg=self.bg_light)
-        dir_frame.grid(row=2, column=1, columnspan=3, sticky=tk.EW, padx=8, pady=6)
+        dir_frame.grid(row=4, column=1, columnspan=3, sticky=tk.EW, padx=8, pady=6)
         
         self.dir_var = tk.StringVar(value="downloads")
         dir_entry = tk.Entry(
@@ -511,6 +471,40 @@ class CnCLabsGUI:
         )
         logs_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         
+        # Level filters and optional log file
+        log_filter_frame = tk.Frame(logs_frame, bg=self.bg_light)
+        log_filter_frame.pack(fill=tk.X, padx=8, pady=(6, 0))
+        
+        self.log_level_vars = {}
+        for level in LogView.LEVELS:
+            var = tk.BooleanVar(value=True)
+            self.log_level_vars[level] = var
+            tk.Checkbutton(
+                log_filter_frame,
+                text=level.capitalize(),
+                variable=var,
+                command=lambda lvl=level: self.toggle_log_level(lvl),
+                bg=self.bg_light,
+                fg=self.text_white,
+                selectcolor=self.bg_dark,
+                activebackground=self.bg_light,
+                activeforeground=self.accent_light,
+                font=("Arial", 9, "bold")
+            ).pack(side=tk.LEFT, padx=4)
+        
+        self.log_to_file_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            log_filter_frame,
+            text="💾 Save Full Log to File",
+            variable=self.log_to_file_var,
+            bg=self.bg_light,
+            fg=self.text_white,
+            selectcolor=self.bg_dark,
+            activebackground=self.bg_light,
+            activeforeground=self.accent_light,
+            font=("Arial", 9, "bold")
+        ).pack(side=tk.RIGHT, padx=4)
+        
         # Log text widget with custom styling
         self.log_text = scrolledtext.ScrolledText(
             logs_frame,
@@ -530,6 +524,9 @@ class CnCLabsGUI:
         self.log_text.tag_config("warning", foreground="#FFAA00")  # Orange
         self.log_text.tag_config("info", foreground=self.accent_light)  # Sky blue
         
+        # Bounded view: old lines are trimmed so long sessions stay fast
+        self.log_view = LogView(self.log_text, max_lines=self.LOG_MAX_LINES)
+        
         # Add initial welcome message
         welcome_msg = """
 ╔══════════════════════════════════════════════════════════════════════╗
@@ -544,32 +541,96 @@ class CnCLabsGUI:
         if directory:
             self.dir_var.set(directory)
     
+    # Works while a download runs: every transfer reads the same limiter
+    def apply_bandwidth(self):
+        try:
+            self.bandwidth.configure(self.rate_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"{e}\nUse a rate like 512K or 2M (0 = unlimited), "
+                                          "or a schedule like 08:00-18:00=512K,*=0")
+            return False
+        return True
+    
+    def on_bandwidth_change(self, old, new):
+        self.log_message(f"[BANDWIDTH] {format_rate(old)} -> {format_rate(new)}", "info")
+    
     def log_message(self, message, log_type="info"):
-        timestamp = time.strftime("%H:%M:%S")
-        full_message = f"[{timestamp}] {message}\n"
-        self.log_text.insert(tk.END, full_message, log_type)
-        self.log_text.see(tk.END)
+        # Safe to call from any thread
+        self.events.log(message, log_type)
     
     def update_progress(self, map_name, percent):
-        self.progress_label.config(text=f"⬇ Downloading: {map_name} - {percent:.1f}%")
+        self.events.progress(map_name, percent)
+
+    # progress_callback of the engine, called from worker threads for every chunk
+    def on_progress(self, map_name, downloaded, total):
+        percent = min(100, downloaded * 100 // total)
+        if self.progress_seen.get(map_name) != percent:
+            self.progress_seen[map_name] = percent
+            self.update_progress(map_name, percent)
+    
+    def pump_events(self):
+        logs, progress, calls = self.events.drain()
+        try:
+            if logs:
+                self.log_view.append(logs)
+            if progress:
+                self.active_maps.update(progress)
+                for name, percent in progress.items():
+                    if percent >= 100:
+                        self.active_maps.pop(name, None)
+                # Show the most recently reported map that is still in flight
+                current = [name for name in progress if name in self.active_maps]
+                if current:
+                    name = current[-1]
+                    more = len(self.active_maps) - 1
+                    suffix = f"  (+{more} more)" if more > 0 else ""
+                    self.progress_label.config(text=f"⬇ Downloading: {name} - {self.active_maps[name]:.0f}%{suffix}")
+            for fn, args in calls:
+                fn(*args)
+        finally:
+            self.root.after(self.EVENT_POLL_MS, self.pump_events)
+    
+    def toggle_log_level(self, level):
+        self.log_view.set_visible(level, self.log_level_vars[level].get())
     
     def start_download(self):
         if self.download_thread and self.download_thread.is_alive():
             messagebox.showwarning("Warning", "Download is already running!")
             return
+        try:
+            player_counts = parse_int_ranges(self.players_var.get())
+        except ValueError:
+            messagebox.showerror("Error", "Players must be a number, a list (2,4,8) or a range (2-8)")
+            return
+        if not self.apply_bandwidth():
+            return
         
         self.start_btn.config(state=tk.DISABLED, bg=self.silver)
         self.stop_btn.config(state=tk.NORMAL, bg="#FF4444", activebackground="#FF6666")
-        self.log_text.delete(1.0, tk.END)
+        self.log_view.clear()
+        self.events.drain()
+        self.active_maps.clear()
+        self.progress_seen.clear()
         self.progress_bar.start(10)
         
+        download_dir = self.dir_var.get()
+        os.makedirs(download_dir, exist_ok=True)
+        if self.log_to_file_var.get():
+            self.log_view.open_file(os.path.join(download_dir, "download.log"))
         self.downloader = CnCLabsDownloader(
-            players=self.players_var.get(),
+            players=player_counts,
             max_pages=self.max_pages_var.get(),
-            download_dir=self.dir_var.get(),
+            download_dir=download_dir,
             max_workers=self.workers_var.get(),
             log_callback=self.log_message,
-            progress_callback=self.update_progress
+            progress_callback=self.on_progress,
+            catalog=MapCatalog(os.path.join(download_dir, "catalog.sqlite3")),
+            incremental=self.incremental_var.get(),
+            page_cache=PageCache(os.path.join(download_dir, ".page-cache")),
+            segments=self.segments_var.get(),
+            dedup='link' if self.dedup_var.get() else 'off',
+            bandwidth=self.bandwidth,
+            journal=CrawlJournal(os.path.join(download_dir, "crawl.journal"), resume=self.resume_var.get())
         )
         
         self.download_thread = threading.Thread(target=self.run_download, daemon=True)
@@ -581,10 +642,18 @@ class CnCLabsGUI:
         except Exception as e:
             self.log_message(f"Fatal error: {str(e)}", "error")
         finally:
-            self.progress_bar.stop()
-            self.start_btn.config(state=tk.NORMAL, bg=self.accent_bright)
-            self.stop_btn.config(state=tk.DISABLED, bg=self.silver)
-            self.progress_label.config(text="✓ Download complete")
+            self.downloader.catalog.close()
+            self.downloader.journal.close()
+            self.events.call_soon(self.download_finished)
+    
+    def download_finished(self):
+        # Logs queued before this call were appended earlier in the same pump_events tick
+        self.log_view.close_file()
+        self.active_maps.clear()
+        self.progress_bar.stop()
+        self.start_btn.config(state=tk.NORMAL, bg=self.accent_bright)
+        self.stop_btn.config(state=tk.DISABLED, bg=self.silver)
+        self.progress_label.config(text="✓ Download complete")
     
     def stop_download(self):
         if self.downloader:
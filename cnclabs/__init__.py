@@ -0,0 +1,23 @@
+"""CNC Labs map downloader engine, shared by the CLI, the GUI and the service.
+
+Names are resolved on first access, so ``import cnclabs`` costs next to nothing and a front end
+only pays for what it actually uses (``AsyncCnCLabsDownloader`` pulls in aiohttp, for example).
+"""
+import importlib
+
+_EXPORTS = {
+    'CnCLabsDownloader': 'cnclabs.core',
+    'StoppedByUser': 'cnclabs.core',
+    'AsyncCnCLabsDownloader': 'cnclabs.async_core',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
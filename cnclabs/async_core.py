@@ -0,0 +1,338 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import random
+import time
+from random import choice
+
+import aiohttp
+import yarl
+
+from .core import CnCLabsDownloader, StoppedByUser
+from .mapdetails import extract_details
+from .mapqueue import MapRanking, expected_size
+from .partfile import PartFile
+from .ratelimit import parse_retry_after
+
+
+class AsyncMapQueue(asyncio.Queue):
+    """asyncio counterpart of mapqueue.MapQueue: workers get the best-ranked map first."""
+
+    def __init__(self, maxsize: int = 0, order: str = 'page', cost=None):
+        self.ranking = MapRanking(order, cost)
+        super().__init__(maxsize)
+
+    # asyncio.Queue.put ends in put_nowait, so ranking here covers both
+    def put_nowait(self, item):
+        super().put_nowait((self.ranking.key(item), item))
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._seq = itertools.count()
+
+    def _put(self, entry):
+        key, item = entry
+        heapq.heappush(self._queue, (key, next(self._seq), item))
+
+    def _get(self):
+        return heapq.heappop(self._queue)[-1]
+
+
+class AsyncCnCLabsDownloader(CnCLabsDownloader):
+    """asyncio engine: one event loop, a pooled keep-alive connector and N fetch tasks."""
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, max_workers: int = 50, limit_per_host: int = 0, keepalive_timeout: float = 30.0, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.http = None
+
+    def open_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.limit_per_host,
+                                         keepalive_timeout=self.keepalive_timeout)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[self.pool_trace()])
+
+    # Counts requests and new connections by host, like the threaded engine's pools (see connpool)
+    def pool_trace(self) -> aiohttp.TraceConfig:
+        metrics = self.metrics
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+
+        async def on_request_redirect(session, ctx, params):
+            location = params.response.headers.get('Location')
+            if location:
+                ctx.host = params.url.join(yarl.URL(location)).host
+
+        async def on_connection_reuseconn(session, ctx, params):
+            metrics.pool_requests.labels(ctx.host).inc()
+
+        async def on_connection_create_end(session, ctx, params):
+            metrics.pool_requests.labels(ctx.host).inc()
+            metrics.connections.labels(ctx.host).inc()
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_redirect.append(on_request_redirect)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        return trace
+
+    # Same retry policy as the threaded engine, but the user agent is sent per request
+    async def request_with_backoff_async(self, url: str, max_attempts: int = 5, headers: dict = None,
+                                         method: str = 'GET') -> aiohttp.ClientResponse:
+        attempt = 0
+        last_exc = None
+        kind = 'probe' if method == 'HEAD' else self.request_kind(url)
+        metrics = self.metrics
+        while attempt < max_attempts:
+            attempt += 1
+            try:
+                async with self.async_request_slot():
+                    started = time.perf_counter()
+                    resp = await self.http.request(method, url, headers={'user-agent': choice(self.USER_AGENTS),
+                                                                          **(headers or {})})
+                    metrics.request_seconds.labels(kind).observe(time.perf_counter() - started)
+                metrics.requests.labels(kind, resp.status).inc()
+                retry_after = self.record_response(resp)
+                if resp.status == 429 or 500 <= resp.status < 600:
+                    resp.release()
+                    backoff_factor = self.backoff_delay(attempt, retry_after)
+                    self.log(f"[{resp.status}] Waiting {backoff_factor:.1f}s (attempt {attempt})", 'warning')
+                    reason = '429' if resp.status == 429 else '5xx'
+                    metrics.retries.labels(reason).inc()
+                    await self.backoff_async('backoff_' + reason, backoff_factor)
+                    last_exc = Exception(str(resp.status))
+                    continue
+                return resp
+            except aiohttp.ClientError as e:
+                last_exc = e
+                if self.limiter is not None:
+                    self.limiter.record_error()
+                backoff_factor = self.backoff_delay(attempt)
+                self.log(f"Request exception: {e}. Retrying in {backoff_factor:.1f}s", 'warning')
+                metrics.retries.labels('exception').inc()
+                await self.backoff_async('backoff_exception', backoff_factor)
+        raise last_exc if last_exc else Exception("Request failed")
+
+    async def sleep_async(self, reason: str, seconds: float):
+        await asyncio.sleep(seconds)
+        self.metrics.sleep_seconds.labels(reason).inc(seconds)
+
+    async def backoff_async(self, reason: str, seconds: float):
+        if self.limiter is None:
+            await self.sleep_async(reason, seconds)
+            return
+        async with self.limiter.async_released():
+            await self.sleep_async(reason, seconds)
+
+    async def throttle_async(self, nbytes: int, flow: str):
+        if self.bandwidth is not None:
+            waited = await self.bandwidth.consume_async(nbytes, flow)
+            if waited:
+                self.metrics.sleep_seconds.labels('bandwidth').inc(waited)
+
+    def async_request_slot(self):
+        return self.limiter.async_slot() if self.limiter is not None else contextlib.nullcontext()
+
+    # aiohttp exposes the status as .status rather than .status_code; the inherited sync paths
+    # (scrape-only runs, details pages for a manifest) still pass requests responses
+    def record_response(self, resp) -> float:
+        status = resp.status if isinstance(resp, aiohttp.ClientResponse) else resp.status_code
+        retry_after = resp.headers.get('Retry-After')
+        if self.limiter is not None:
+            return self.limiter.record(status, retry_after)
+        return parse_retry_after(retry_after) if status == 429 or status >= 500 else 0.0
+
+    async def fetch_map(self, map_info: dict) -> tuple[str, bool, str]:
+        map_name = map_info['Name']
+        if self.stopped:
+            return (map_name, False, "Stopped by user")
+        target_path = self.target_path(map_info)
+        existing = target_path if os.path.exists(target_path) else self.known_path(map_info)
+        if existing:
+            size = os.path.getsize(existing) if os.path.isfile(existing) else None
+            self.record_result(map_info, True, existing, size)
+            return (map_name, True, f"Skipped (exists) {existing}")
+        started = time.perf_counter()
+        try:
+            part = PartFile(target_path)
+            resp = await self.request_with_backoff_async(map_info['DownloadUrl'], headers=part.request_headers())
+            if not part.accepts(resp.status, resp.headers):
+                if part.offset and resp.status != 200:
+                    resp.release()
+                    resp = await self.request_with_backoff_async(map_info['DownloadUrl'])
+                part.restart(resp.headers)
+            async with resp:
+                total_size = part.total_size(resp.status, resp.headers)
+                downloaded = part.offset
+                digest = part.digest()
+                received = self.metrics.bytes.labels(asyncio.current_task().get_name())
+                with part.open(total_size) as f:
+                    async for chunk in resp.content.iter_chunked(self.CHUNK_SIZE):
+                        if self.stopped:
+                            # Keep the .part file so the next run can resume it
+                            raise StoppedByUser()
+                        f.write(chunk)
+                        digest.update(chunk)
+                        downloaded += len(chunk)
+                        received.inc(len(chunk))
+                        self.report_progress(map_name, downloaded, total_size)
+                        await self.throttle_async(len(chunk), map_name)
+            sha256 = digest.hexdigest()
+            # Zip validation reads the central directory; keep it off the event loop
+            final_path, duplicate_of = await asyncio.to_thread(self.finalize_download, part,
+                                                               total_size or map_info.get('Size'), downloaded,
+                                                               sha256, map_info.get('SHA256'))
+            self.record_result(map_info, True, final_path, downloaded, sha256)
+            self.metrics.maps.labels('ok').inc()
+            self.metrics.map_seconds.observe(time.perf_counter() - started)
+            return (map_name, True, f"Duplicate of {duplicate_of}" if duplicate_of else final_path)
+        except Exception as e:
+            if self.stopped:
+                return (map_name, False, "Stopped by user")
+            self.record_result(map_info, False, str(e))
+            self.metrics.maps.labels('failed').inc()
+            return (map_name, False, str(e))
+
+    async def scrape_page_async(self, page: int, players: int) -> list:
+        url = f"{self.BASE_URL}/maps/generals/zerohour-maps.aspx?page={page}&players={players}"
+        headers = self.page_cache.conditional_headers(url) if self.page_cache else None
+        resp = await self.request_with_backoff_async(url, headers=headers)
+        if resp.status == 304:
+            resp.release()
+            cached = self.page_cache.revalidated(url)
+            if cached is not None:
+                return cached
+            resp = await self.request_with_backoff_async(url)
+        async with resp:
+            html = await resp.text()
+        # Parsing is CPU work; keep it off the event loop
+        links = await asyncio.to_thread(self.parse_links, html)
+        maps_list = [self.build_map_info(link, players) for link in links]
+        if self.page_cache:
+            self.page_cache.put(url, resp.headers, maps_list)
+        return maps_list
+
+    async def enrich_map_async(self, map_info: dict) -> dict:
+        url = map_info.get('DetailsUrl')
+        if not url:
+            return map_info
+        try:
+            details = self.details_cache.get(url) if self.details_cache is not None else None
+            if details is None:
+                resp = await self.request_with_backoff_async(url)
+                async with resp:
+                    html = await resp.text()
+                details = await asyncio.to_thread(extract_details, html, url)
+                if self.details_cache is not None:
+                    self.details_cache.put(url, details)
+            return {**map_info, **details}
+        except Exception as e:
+            self.log(f"[WARN] No details for {map_info['Name']}: {e}", 'warning')
+            return map_info
+
+    async def probe_map_async(self, map_info: dict) -> dict:
+        if expected_size(map_info) is not None or os.path.exists(self.target_path(map_info)) \
+                or self.known_path(map_info):
+            return map_info
+        try:
+            resp = await self.request_with_backoff_async(map_info['DownloadUrl'], method='HEAD')
+            resp.release()
+            size = int(resp.headers.get('Content-Length') or 0) if resp.status == 200 else 0
+        except Exception as e:
+            self.log(f"[WARN] No size for {map_info['Name']}: {e}", 'warning')
+            return map_info
+        if not size:
+            return map_info
+        if self.catalog is not None and map_info.get('DetailsUrl'):
+            self.catalog.set_size(map_info['DetailsUrl'], size)
+        return {**map_info, 'ProbedSize': size}
+
+    # Details pages and size probes run on the shared session, at most details_workers at a time
+    async def select_maps_async(self, maps_list: list) -> list:
+        gate = asyncio.Semaphore(self.details_workers)
+
+        async def gated(fn, m):
+            async with gate:
+                return await fn(m)
+        if self.wants_details and maps_list:
+            maps_list = await asyncio.gather(*(gated(self.enrich_map_async, m) for m in maps_list))
+        maps_list = self.filter_maps(list(maps_list))
+        if self.probe_sizes and any(expected_size(m) is None for m in maps_list):
+            maps_list = list(await asyncio.gather(*(gated(self.probe_map_async, m) for m in maps_list)))
+        return maps_list
+
+    async def produce_maps_async(self, jobs: asyncio.Queue):
+        scheduler = self.crawl_scheduler()
+        for m in self.resumed_maps():
+            await jobs.put(m)
+        first = True
+        while not self.stopped:
+            nxt = scheduler.next_page()
+            if nxt is None:
+                break
+            players, page = nxt
+            if not first:
+                await self.sleep_async('page_delay', random.uniform(2, 5))
+            first = False
+            more = True
+            try:
+                maps_list = await self.scrape_page_async(page, players)
+                more = bool(maps_list) and self.catalog_page(page, maps_list)
+                for m in await self.select_maps_async(scheduler.unseen(maps_list)):
+                    self.journal_queued(m)
+                    await jobs.put(m)
+                self.journal_page(players, page, more)
+            except Exception as e:
+                self.page_failed(players, page, e)
+            scheduler.page_done(players, page, more)
+
+    async def download_worker_async(self, jobs: asyncio.Queue, results: list):
+        while True:
+            m = await jobs.get()
+            if m is None:
+                return
+            async with self.async_request_slot():
+                name, ok, msg = await self.fetch_map(m)
+            results.append((name, ok, msg))
+            self.log_result(name, ok, msg)
+
+    async def run(self, maps_list: list = None) -> list:
+        results = []
+        jobs = self.map_queue()
+        self.metrics.queue_depth.set_function(jobs.qsize)
+        async with self.open_session() as self.http:
+            workers = [asyncio.create_task(self.download_worker_async(jobs, results), name=f'worker-{i}')
+                       for i in range(self.pool_size)]
+            try:
+                if maps_list is None:
+                    await self.produce_maps_async(jobs)
+                else:
+                    if self.order != 'page':
+                        maps_list = sorted(maps_list, key=jobs.ranking.key)
+                    for m in maps_list:
+                        await jobs.put(m)
+            finally:
+                for _ in workers:
+                    await jobs.put(None)
+                await asyncio.gather(*workers)
+        self.http = None
+        return results
+
+    def map_queue(self) -> AsyncMapQueue:
+        return AsyncMapQueue(self.queue_window(), self.order, cost=self.expected_cost)
+
+    def download_map(self, map_info: dict) -> tuple[str, bool, str]:
+        return self.download_maps([map_info])[0]
+
+    # Download a fixed list of maps without scraping listing pages
+    def download_maps(self, maps_list: list) -> list:
+        return asyncio.run(self.run(maps_list))
+
+    def download_all_maps(self):
+        asyncio.run(self.run())
+        self.crawl_finished()
@@ -0,0 +1,350 @@
+"""Global bandwidth shaping: one token bucket shared by every download thread and task.
+
+Archive bytes are paid for as they arrive. Readers that have to wait are served round-robin per
+*flow* (one flow per map), so an archive fetched over several segments gets the same share as a
+small one next to it and cannot starve it. The rate can be changed while a crawl runs
+(``set_rate``/``set_schedule``, a control file, the GUI or the service API), and a schedule can
+give different rates by time of day, e.g. ``"08:00-18:00=512K,*=0"``.
+"""
+import collections
+import datetime
+import os
+import re
+import threading
+import time
+
+RATE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2, 'g': 1024 ** 3, 'gb': 1024 ** 3}
+UNLIMITED = ('', '0', 'off', 'none', 'unlimited')
+
+
+def parse_rate(text) -> int:
+    """Bytes per second from ``512K``, ``2M``, ``1.5MB/s`` or ``65536``; 0 (or ``off``) means unlimited."""
+    if text is None:
+        return 0
+    if isinstance(text, (int, float)):
+        return max(0, int(text))
+    value = text.strip().lower()
+    if value.endswith('/s'):
+        value = value[:-2].strip()
+    if value in UNLIMITED:
+        return 0
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([kmg]?b?)', value)
+    if not match:
+        raise ValueError(f"Not a transfer rate: {text!r}")
+    return int(float(match.group(1)) * RATE_UNITS[match.group(2)])
+
+
+def format_rate(rate: int) -> str:
+    if not rate:
+        return "unlimited"
+    if rate >= 1024 ** 2:
+        return f"{rate / 1024 ** 2:.1f} MB/s"
+    return f"{rate / 1024:.0f} KB/s"
+
+
+def _minute_of_day(text: str) -> int:
+    match = re.fullmatch(r'(\d{1,2}):(\d{2})', text.strip())
+    minute = int(match.group(1)) * 60 + int(match.group(2)) if match else -1
+    if not match or int(match.group(2)) > 59 or minute > 24 * 60:
+        raise ValueError(f"Not a time of day (HH:MM): {text!r}")
+    return minute
+
+
+class BandwidthSchedule:
+    """Rates by local time of day, e.g. ``"08:00-18:00=512K,18:00-08:00=0"``.
+
+    Windows are checked in order and the first match wins; ``*`` matches any time and a window
+    may wrap past midnight. Outside every window the limiter's own rate applies.
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec.strip()
+        self.windows = []  # (start minute, end minute, rate); None bounds for '*'
+        for part in self.spec.split(','):
+            if not part.strip():
+                continue
+            span, sep, rate = part.partition('=')
+            if not sep:
+                raise ValueError(f"Schedule window needs '=RATE': {part.strip()!r}")
+            span = span.strip()
+            if span == '*':
+                self.windows.append((None, None, parse_rate(rate)))
+                continue
+            start, sep, end = span.partition('-')
+            if not sep:
+                raise ValueError(f"Schedule window needs 'HH:MM-HH:MM': {span!r}")
+            self.windows.append((_minute_of_day(start), _minute_of_day(end), parse_rate(rate)))
+        if not self.windows:
+            raise ValueError("Empty bandwidth schedule")
+
+    def rate_at(self, when: datetime.datetime = None):
+        """The scheduled rate at ``when`` (default: now), or None outside every window."""
+        when = when or datetime.datetime.now()
+        minute = when.hour * 60 + when.minute
+        for start, end, rate in self.windows:
+            if start is None:
+                return rate
+            inside = start <= minute < end if start <= end else minute >= start or minute < end
+            if inside:
+                return rate
+        return None
+
+    def __str__(self):
+        return self.spec
+
+
+class BandwidthLimiter:
+    """Token bucket in bytes per second shared by every transfer of a run; 0 means unlimited.
+
+    ``burst`` is the most an idle bucket saves up (a quarter second of traffic by default). A read
+    larger than that is let through once the bucket is full and leaves it in debt, so the chunk
+    size of the caller does not matter. With ``share`` N every configured rate is divided by N,
+    for N processes splitting one link.
+    """
+    MIN_BURST = 64 * 1024
+    # How often the schedule is looked at again
+    SCHEDULE_CHECK = 1.0
+
+    def __init__(self, rate=0, schedule=None, burst: int = None, share: int = 1, on_change=None):
+        self.rate = parse_rate(rate)
+        self.schedule = BandwidthSchedule(schedule) if isinstance(schedule, str) else schedule
+        self.burst = burst
+        self.share = max(1, share)
+        self.on_change = on_change
+        self.granted = 0
+        self.waited = 0.0
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+        self._effective = None
+        self._checked = 0.0
+        self._change = None
+        # flow -> tickets of the reads waiting in it; the flow at the front is served next
+        self._flows = collections.OrderedDict()
+        self._cond = threading.Condition()
+        with self._cond:
+            self._update_rate(force=True)
+
+    # ---- configuration ----
+
+    @property
+    def effective(self) -> int:
+        """The rate in force right now (schedule window, else the base rate), per share."""
+        with self._cond:
+            self._update_rate()
+            return self._effective
+
+    def set_rate(self, rate):
+        """Change the base rate; takes effect for the next read of every transfer."""
+        rate = parse_rate(rate)
+        with self._cond:
+            self.rate = rate
+            self._update_rate(force=True)
+            self._cond.notify_all()
+        self._notify()
+
+    def set_schedule(self, schedule):
+        """Replace the time-of-day schedule (a spec string, a BandwidthSchedule or None)."""
+        schedule = BandwidthSchedule(schedule) if isinstance(schedule, str) and schedule.strip() else schedule or None
+        with self._cond:
+            self.schedule = schedule
+            self._update_rate(force=True)
+            self._cond.notify_all()
+        self._notify()
+
+    def configure(self, text: str):
+        """Apply a setting as a user types it: a schedule (``08:00-18:00=512K,*=0``) replaces the
+        schedule, a plain rate (``512K``, ``0``) clears any schedule and becomes the rate."""
+        text = (text or '').strip()
+        if '=' in text:
+            self.set_schedule(text)
+        else:
+            rate = parse_rate(text)
+            self.set_schedule(None)
+            self.set_rate(rate)
+
+    def status(self) -> dict:
+        with self._cond:
+            self._update_rate()
+            return {
+                'rate': self.rate,
+                'schedule': str(self.schedule) if self.schedule is not None else None,
+                'effective': self._effective,
+                'share': self.share,
+                'waiting_flows': len(self._flows),
+                'granted_bytes': self.granted,
+                'waited_seconds': round(self.waited, 3),
+            }
+
+    # Recompute the rate in force (caller holds the lock); a change is reported by _notify
+    def _update_rate(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.SCHEDULE_CHECK:
+            return
+        self._checked = now
+        scheduled = self.schedule.rate_at() if self.schedule is not None else None
+        rate = (self.rate if scheduled is None else scheduled) // self.share
+        old = self._effective
+        if rate == old:
+            return
+        # Tokens saved at the old rate don't carry over into a burst at the new one
+        self._refill()
+        self._effective = rate
+        self._tokens = min(self._tokens, self._capacity()) if rate else 0.0
+        if old is not None:
+            self._change = (self._change[0] if self._change else old, rate)
+
+    # on_change runs outside the lock
+    def _notify(self):
+        with self._cond:
+            change, self._change = self._change, None
+        if change and change[0] != change[1] and self.on_change:
+            try:
+                self.on_change(*change)
+            except Exception:
+                pass
+
+    def _capacity(self) -> float:
+        return self.burst or max(self.MIN_BURST, self._effective / 4)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._effective:
+            self._tokens = min(self._capacity(), self._tokens + (now - self._refilled) * self._effective)
+        self._refilled = now
+
+    # ---- taking bytes ----
+
+    # Register a read at the back of its flow (caller holds the lock)
+    def _enqueue(self, flow):
+        ticket = object()
+        self._flows.setdefault(flow, collections.deque()).append(ticket)
+        return ticket
+
+    def _drop(self, flow, ticket):
+        tickets = self._flows.get(flow)
+        if tickets is None or ticket not in tickets:
+            return
+        tickets.remove(ticket)
+        if not tickets:
+            del self._flows[flow]
+        self._cond.notify_all()
+
+    def _try_take(self, flow, ticket, nbytes: int):
+        """Grant the read if it is next in line and the bucket allows it: 0.0 when granted, else seconds to wait
+        (None while other flows are ahead of it). Caller holds the lock."""
+        self._update_rate()
+        if not self._effective:
+            self._drop(flow, ticket)
+            return 0.0
+        if next(iter(self._flows)) != flow or self._flows[flow][0] is not ticket:
+            return None
+        self._refill()
+        need = min(nbytes, self._capacity())
+        if self._tokens < need:
+            return (need - self._tokens) / self._effective
+        self._tokens -= nbytes
+        self.granted += nbytes
+        self._drop(flow, ticket)
+        # A served flow goes to the back, so every other waiting flow gets a turn first
+        if flow in self._flows:
+            self._flows.move_to_end(flow)
+        return 0.0
+
+    def consume(self, nbytes: int, flow=None, cancelled=None) -> float:
+        """Block until ``nbytes`` may be used; returns the seconds spent waiting.
+
+        ``cancelled`` is polled while waiting; when it returns true the read gives up its place
+        and returns at once (the caller then notices the stop itself).
+        """
+        if nbytes <= 0 or (not self.rate and self.schedule is None):
+            return 0.0
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(flow)
+            try:
+                while True:
+                    wait = self._try_take(flow, ticket, nbytes)
+                    if wait == 0.0:
+                        break
+                    if cancelled is not None and cancelled():
+                        self._drop(flow, ticket)
+                        break
+                    self._cond.wait(min(wait, 0.25) if wait is not None else 0.25)
+            except BaseException:
+                self._drop(flow, ticket)
+                raise
+            waited = time.monotonic() - started
+            self.waited += waited
+        self._notify()
+        return waited
+
+    async def consume_async(self, nbytes: int, flow=None) -> float:
+        """``consume`` for the asyncio engine: waits with asyncio.sleep instead of blocking the loop."""
+        if nbytes <= 0 or (not self.rate and self.schedule is None):
+            return 0.0
+        import asyncio
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(flow)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(flow, ticket, nbytes)
+                self._notify()
+                if wait == 0.0:
+                    break
+                await asyncio.sleep(min(wait, 0.25) if wait is not None else 0.01)
+        except BaseException:
+            with self._cond:
+                self._drop(flow, ticket)
+            raise
+        waited = time.monotonic() - started
+        with self._cond:
+            self.waited += waited
+        return waited
+
+
+class RateControlFile:
+    """Poll a small text file and apply it to a limiter, so a running CLI crawl can be re-limited.
+
+    The file holds what ``BandwidthLimiter.configure`` takes: a rate (``512K``, ``0`` for
+    unlimited) or a schedule (``08:00-18:00=512K,*=0``). It is re-read whenever it changes.
+    """
+
+    def __init__(self, limiter: BandwidthLimiter, path: str, interval: float = 2.0, on_error=None):
+        self.limiter = limiter
+        self.path = path
+        self.interval = interval
+        self.on_error = on_error
+        self._mtime = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rate-file', daemon=True)
+
+    def start(self):
+        self.poll()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def poll(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.limiter.configure(f.read())
+        except (OSError, ValueError) as e:
+            if self.on_error is not None:
+                self.on_error(f"[BANDWIDTH] Ignoring {self.path}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
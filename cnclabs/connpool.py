@@ -0,0 +1,55 @@
+"""Pooled keep-alive connections for the threaded engine.
+
+One ``requests`` session is shared by every worker. Its headers are never changed after it is
+built; anything that varies (user agent, Range, conditional headers) is passed per request. Its
+urllib3 pools are sized to the downloader's concurrency, so a busy host keeps every connection
+instead of closing the ones that don't fit back into a 10-connection pool. Each pool counts the
+requests it sends and the connections it opens (TCP and TLS handshakes) into the downloader's
+metrics, so ``DownloaderMetrics.connection_reuse`` can show whether keep-alive reuse works.
+"""
+# Hosts whose pools are kept at once: the site itself plus whatever hosts the archives redirect to
+HOST_POOLS = 8
+
+
+def _counting_pools(sent, opened) -> dict:
+    """Pool classes for a PoolManager that count into ``sent`` and ``opened`` (metrics counters by host)."""
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def counted(connection_cls):
+        class CountingConnection(connection_cls):
+            # Also runs when a connection the server closed is opened again
+            def connect(self):
+                opened.labels(self.host).inc()
+                return super().connect()
+        return CountingConnection
+
+    def counting(pool_cls):
+        class CountingPool(pool_cls):
+            ConnectionCls = counted(pool_cls.ConnectionCls)
+
+            def _get_conn(self, timeout=None):
+                sent.labels(self.host).inc()
+                return super()._get_conn(timeout)
+        return CountingPool
+
+    return {'http': counting(HTTPConnectionPool), 'https': counting(HTTPSConnectionPool)}
+
+
+def pooled_session(connections: int, sent, opened):
+    """A requests session whose pools keep up to ``connections`` connections per host."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_classes = _counting_pools(sent, opened)
+
+    class CountingAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = pool_classes
+
+    session = requests.Session()
+    adapter = CountingAdapter(pool_connections=HOST_POOLS, pool_maxsize=connections)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
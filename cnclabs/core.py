@@ -0,0 +1,721 @@
+"""The download engine shared by the CLI, the GUI, the async engine and the service.
+
+The engine never prints. Messages go to ``log_callback(message, level)`` with a level of
+``info``, ``success``, ``warning`` or ``error``, and transfer progress goes to
+``progress_callback(name, downloaded, total)``. Each front end decides how to show them.
+
+Heavy dependencies are imported when first used: requests with the first request, lxml with
+the first listing page, zipfile with the first archive check. Importing this module (and
+running ``--help``) stays cheap.
+"""
+from __future__ import annotations
+
+import contextlib
+import os
+import queue
+import random
+import re
+import threading
+import time
+from random import choice
+from typing import TYPE_CHECKING
+
+from .crawlplan import CrawlScheduler
+from .mapqueue import MapQueue, MapRanking, expected_size
+from .metrics import DownloaderMetrics
+from .partfile import PartFile
+from .ratelimit import AdaptiveLimiter, parse_retry_after
+from .streamio import ChunkSizer, read_chunks, sync_dir, sync_file
+
+if TYPE_CHECKING:
+    from .bandwidth import BandwidthLimiter
+    from .journal import CrawlJournal
+    from .manifest import ManifestWriter
+    from .mapcatalog import MapCatalog
+    from .mapdetails import DetailsCache, MapFilter
+    from .mapinstall import MapInstaller
+    from .pagecache import PageCache
+
+
+class StoppedByUser(Exception):
+    pass
+
+
+class CnCLabsDownloader:
+    BASE_URL = 'https://www.cnclabs.com'
+    USER_AGENTS = [
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu Chromium/37.0.2062.94 Chrome/37.0.2062.94 Safari/537.36',
+        'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/45.0.2454.85 Safari/537.36',
+        'Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko',
+        'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:40.0) Gecko/20100101 Firefox/40.0'
+    ]
+    # Pending map jobs allowed per worker before the page scraper blocks
+    QUEUE_DEPTH_PER_WORKER = 4
+    # With a priority order the queue looks further ahead, so it has something to choose from
+    SCHEDULE_WINDOW = 64
+    # Archives smaller than this always use a single stream
+    SEGMENT_THRESHOLD = 8 * 1024 * 1024
+    # Without max_concurrency the adaptive limit may grow to this many times max_workers
+    GROWTH = 2
+    # Largest read of an archive body; reads grow towards it on a fast link (see streamio)
+    MAX_CHUNK = 1024 * 1024
+
+    def __init__(self, players=8, max_pages: int = 10, download_dir: str = "downloads", max_workers: int = 3,
+                 log_callback=None, progress_callback=None, catalog: MapCatalog = None, incremental: bool = False,
+                 page_cache: PageCache = None, segments: int = 1, segment_threshold: int = None,
+                 adaptive: bool = True, max_concurrency: int = None, verify: str = 'basic', dedup: str = 'off',
+                 start_page: int = 1, metrics: DownloaderMetrics = None, base_url: str = None,
+                 failed_manifest: ManifestWriter = None, journal: CrawlJournal = None,
+                 installer: MapInstaller = None, details_cache: DetailsCache = None, map_filter: MapFilter = None,
+                 details_workers: int = 4, bandwidth: BandwidthLimiter = None, order: str = 'page',
+                 probe_sizes: bool = False, durability: str = 'commit'):
+        # A single player count or a list of them crawled together in one run
+        self.player_counts = [players] if isinstance(players, int) else list(dict.fromkeys(players))
+        self.start_page = start_page
+        self.max_pages = max_pages
+        # The site can be swapped, e.g. for the local stub server
+        if base_url:
+            self.BASE_URL = base_url.rstrip('/')
+        self.download_dir = download_dir
+        self.max_workers = max_workers
+        # The adaptive limit starts at max_workers and may grow up to max_concurrency
+        if max_concurrency is None:
+            max_concurrency = max_workers * self.GROWTH if adaptive else max_workers
+        self.pool_size = max(max_workers, max_concurrency)
+        self.limiter = AdaptiveLimiter(initial=max_workers, maximum=self.pool_size,
+                                       on_change=self.on_limit_change) if adaptive else None
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        self.catalog = catalog
+        self.incremental = incremental
+        # When the current crawl began; maps first seen since then still count as new (see catalog_page)
+        self.crawl_started = None
+        # Listing pages of the current crawl that failed after their retries: (players, page, error)
+        self.failed_pages = []
+        self.page_cache = page_cache
+        self.segments = segments
+        self.segment_threshold = self.SEGMENT_THRESHOLD if segment_threshold is None else segment_threshold
+        # Archive check: off / basic (zip central directory) / full (CRC of every member)
+        self.verify = verify
+        os.makedirs(self.download_dir, exist_ok=True)
+        # Content-hash dedup: link (hardlink duplicates) / skip (don't store them at all)
+        self.store = None
+        if dedup != 'off':
+            from .integrity import ContentStore
+            self.store = ContentStore(os.path.join(self.download_dir, '.objects'), link=dedup == 'link')
+        self._session = None
+        self._session_lock = threading.Lock()
+        # Maps that fail are written to a manifest so they can be retried later
+        self.failed_manifest = failed_manifest
+        # Crawl journal used to resume an interrupted or stopped crawl
+        self.journal = journal
+        # Finished archives are unpacked into the game's Maps folder on their own threads
+        self.installer = installer
+        if installer is not None and installer.on_result is None:
+            installer.on_result = self.on_installed
+        # Details pages (author, rating, date...) are fetched in parallel and cached; the filter runs before scheduling
+        self.details_cache = details_cache
+        self.map_filter = map_filter
+        self.details_workers = details_workers
+        # Archive bytes are paid for at a shared, runtime-adjustable rate; each map is one fair-share flow
+        self.bandwidth = bandwidth
+        if bandwidth is not None and bandwidth.on_change is None:
+            bandwidth.on_change = self.on_bandwidth_change
+        # Which queued map a free worker takes next (see mapqueue); HEAD probes fill in unknown sizes
+        self.order = order
+        self.probe_sizes = probe_sizes
+        # When finished archives are fsynced: off / commit (before and after the rename, see streamio)
+        self.durability = durability
+        self.total_downloaded = 0
+        self._count_lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Request latency, bytes per worker, time spent waiting...
+        self.metrics = metrics or DownloaderMetrics()
+        if self.limiter is not None:
+            self.metrics.concurrency.set_function(lambda: self.limiter.current)
+            self.metrics.in_flight.set_function(lambda: self.limiter.in_flight)
+        else:
+            self.metrics.concurrency.set(self.max_workers)
+        if self.bandwidth is not None:
+            self.metrics.bandwidth_limit.set_function(lambda: self.bandwidth.effective)
+
+    # requests is only imported once something is actually fetched. The session is shared by every
+    # thread and never changed after it is built (headers go with each request, see connpool)
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    from .connpool import pooled_session
+                    self._session = pooled_session(self.connection_pool_size(), self.metrics.pool_requests,
+                                                   self.metrics.connections)
+        return self._session
+
+    # Connections kept per host: every limiter slot times the segments of its archive, plus the
+    # details/probe threads and the page scraper
+    def connection_pool_size(self) -> int:
+        return self.pool_size * max(1, self.segments) + self.details_workers + 1
+
+    def log(self, message: str, level: str = 'info'):
+        if self.log_callback is not None:
+            try:
+                self.log_callback(message, level)
+            except Exception:
+                pass
+
+    def report_progress(self, name: str, downloaded: int, total: int):
+        if self.progress_callback is not None and total > 0:
+            self.progress_callback(name, downloaded, total)
+
+    # ---- stop ----
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    @property
+    def is_running(self) -> bool:
+        return not self._stopped.is_set()
+
+    # Metrics label for a request: listing page, details page or archive
+    @staticmethod
+    def request_kind(url: str) -> str:
+        if 'zerohour-maps.aspx' in url:
+            return 'listing'
+        return 'details' if 'details.aspx' in url else 'fetch'
+
+    def request_with_backoff(self, url: str, max_attempts: int = 5, method: str = 'GET', **kwargs):
+        import requests
+        attempt = 0
+        last_exc = None
+        kind = 'probe' if method == 'HEAD' else self.request_kind(url)
+        metrics = self.metrics
+        headers = kwargs.pop('headers', None) or {}
+        while attempt < max_attempts:
+            attempt += 1
+            try:
+                with self.request_slot():
+                    started = time.perf_counter()
+                    resp = self.session.request(method, url, headers={'user-agent': choice(self.USER_AGENTS),
+                                                                      **headers}, **kwargs)
+                    metrics.request_seconds.labels(kind).observe(time.perf_counter() - started)
+                metrics.requests.labels(kind, resp.status_code).inc()
+                retry_after = self.record_response(resp)
+                if resp.status_code == 429:
+                    backoff_factor = self.backoff_delay(attempt, retry_after)
+                    self.log(f"[429] Waiting {backoff_factor:.1f}s (attempt {attempt})", 'warning')
+                    metrics.retries.labels('429').inc()
+                    self.backoff('backoff_429', backoff_factor)
+                    last_exc = Exception("429")
+                    continue
+                if 500 <= resp.status_code < 600:
+                    backoff_factor = self.backoff_delay(attempt, retry_after)
+                    self.log(f"[{resp.status_code}] Server error. Waiting {backoff_factor:.1f}s", 'warning')
+                    metrics.retries.labels('5xx').inc()
+                    self.backoff('backoff_5xx', backoff_factor)
+                    last_exc = Exception(str(resp.status_code))
+                    continue
+                return resp
+            except requests.RequestException as e:
+                last_exc = e
+                if self.limiter is not None:
+                    self.limiter.record_error()
+                backoff_factor = self.backoff_delay(attempt)
+                self.log(f"Request exception: {e}. Retrying in {backoff_factor:.1f}s", 'warning')
+                metrics.retries.labels('exception').inc()
+                self.backoff('backoff_exception', backoff_factor)
+        raise last_exc if last_exc else Exception("Request failed")
+
+    # Retry-After from the server wins over our own exponential backoff; the jitter on top keeps
+    # the workers it throttled together from retrying at the same instant
+    @staticmethod
+    def backoff_delay(attempt: int, retry_after: float = 0.0) -> float:
+        if retry_after:
+            return retry_after + random.uniform(0, 1.5)
+        return min(60, (2 ** attempt) + random.uniform(0, 1.5))
+
+    # The slot is free while we wait; the retry takes one again under the current limit and pause
+    def backoff(self, reason: str, seconds: float):
+        with self.limiter.released() if self.limiter is not None else contextlib.nullcontext():
+            self.metrics.sleep(reason, seconds)
+
+    # Every request goes through the shared adaptive limiter (when enabled)
+    def request_slot(self):
+        return self.limiter.slot() if self.limiter is not None else contextlib.nullcontext()
+
+    # Feeds the shared limiter; returns the Retry-After delay in seconds
+    def record_response(self, resp) -> float:
+        retry_after = resp.headers.get('Retry-After')
+        if self.limiter is not None:
+            return self.limiter.record(resp.status_code, retry_after)
+        return parse_retry_after(retry_after) if resp.status_code == 429 or resp.status_code >= 500 else 0.0
+
+    def on_limit_change(self, old: int, new: int):
+        self.log(f"[LIMIT] Parallel downloads {old} -> {new}", 'warning' if new < old else 'info')
+
+    # Blocks the reading thread until the shared bandwidth limit allows nbytes more
+    def throttle(self, nbytes: int, flow: str):
+        if self.bandwidth is not None:
+            waited = self.bandwidth.consume(nbytes, flow, cancelled=self._stopped.is_set)
+            if waited:
+                self.metrics.sleep_seconds.labels('bandwidth').inc(waited)
+
+    def on_bandwidth_change(self, old: int, new: int):
+        from .bandwidth import format_rate
+        self.log(f"[BANDWIDTH] {format_rate(old)} -> {format_rate(new)}", 'info')
+
+    # (name, href) pairs of the map links on a listing page, without building a full tree
+    @staticmethod
+    def get_maps_urls(html_content: str):
+        from .listingparser import extract_map_links
+        return extract_map_links(html_content)
+
+    @staticmethod
+    def sanitize_filename(name: str) -> str:
+        name = re.sub(r'[\\/:"*?<>|]+', '_', name).strip()
+        return name[:200] if len(name) > 200 else name
+
+    def target_path(self, map_info: dict) -> str:
+        return os.path.join(self.download_dir, self.sanitize_filename(map_info['Name']) + '.zip')
+
+    def download_map(self, map_info: dict) -> tuple[str, bool, str]:
+        map_name = map_info['Name']
+        if self.stopped:
+            return (map_name, False, "Stopped by user")
+        map_url = map_info['DownloadUrl']
+        target_path = self.target_path(map_info)
+        existing = target_path if os.path.exists(target_path) else self.known_path(map_info)
+        if existing:
+            # After --after-install delete this is the installed folder; keep the archive size the catalog has
+            size = os.path.getsize(existing) if os.path.isfile(existing) else None
+            self.record_result(map_info, True, existing, size)
+            return (map_name, True, f"Skipped (exists) {existing}")
+        started = time.perf_counter()
+        try:
+            # Resume an existing .part with a Range request; fall back to a full GET if the server ignores it
+            part = PartFile(target_path)
+            r = self.request_with_backoff(map_url, stream=True, headers=part.request_headers())
+            if part.accepts(r.status_code, r.headers):
+                self.log(f"[RESUME] {map_name} from {part.offset // 1024} KB", 'info')
+            else:
+                if part.offset and r.status_code != 200:
+                    r.close()
+                    r = self.request_with_backoff(map_url, stream=True)
+                # Large archives are split across several connections
+                from .segmented import SegmentedDownload
+                if SegmentedDownload.eligible(r.status_code, r.headers, self.segments, self.segment_threshold):
+                    r.close()
+                    downloaded, sha256 = self.download_segmented(map_name, map_url, part, r.headers)
+                    total_size = downloaded
+                    r = None
+                else:
+                    part.restart(r.headers)
+            if r is not None:
+                total_size = part.total_size(r.status_code, r.headers)
+                downloaded = part.offset
+                digest = part.digest()
+                received = self.metrics.bytes.labels(threading.current_thread().name)
+                with part.open(total_size) as f:
+                    for chunk in read_chunks(r, self.chunk_sizer()):
+                        if self.stopped:
+                            # Keep the .part file so the next run can resume it
+                            r.close()
+                            raise StoppedByUser()
+                        if chunk:
+                            f.write(chunk)
+                            digest.update(chunk)
+                            downloaded += len(chunk)
+                            received.inc(len(chunk))
+                            self.report_progress(map_name, downloaded, total_size)
+                            self.throttle(len(chunk), map_name)
+                sha256 = digest.hexdigest()
+            final_path, duplicate_of = self.finalize_download(part, total_size or map_info.get('Size'), downloaded,
+                                                              sha256, map_info.get('SHA256'))
+            self.record_result(map_info, True, final_path, downloaded, sha256)
+            self.metrics.maps.labels('ok').inc()
+            self.metrics.map_seconds.observe(time.perf_counter() - started)
+            return (map_name, True, f"Duplicate of {duplicate_of}" if duplicate_of else final_path)
+        except Exception as e:
+            if self.stopped:
+                return (map_name, False, "Stopped by user")
+            self.record_result(map_info, False, str(e))
+            self.metrics.maps.labels('failed').inc()
+            return (map_name, False, str(e))
+
+    # Under a bandwidth limit reads stay at a quarter second of it, so the fair share stays fine-grained
+    def chunk_sizer(self) -> ChunkSizer:
+        rate = self.bandwidth.effective if self.bandwidth is not None else 0
+        return ChunkSizer(maximum=min(self.MAX_CHUNK, max(64 * 1024, rate // 4)) if rate else self.MAX_CHUNK)
+
+    # Check size, hash and archive, then move into place (or link to an existing copy with the same content).
+    # expected_sha256 comes from a manifest, when it has one
+    def finalize_download(self, part: PartFile, expected: int, downloaded: int, sha256: str,
+                          expected_sha256: str = None) -> tuple[str, str]:
+        if expected and downloaded != expected:
+            # Leave the .part file so the next run resumes it
+            raise Exception(f"Size mismatch: got {downloaded} of {expected} bytes")
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            part.discard()
+            raise Exception(f"SHA-256 mismatch: got {sha256}, expected {expected_sha256}")
+        if self.verify != 'off':
+            from .integrity import validate_archive
+            try:
+                validate_archive(part.path, full=self.verify == 'full')
+            except Exception:
+                part.discard()
+                raise
+        if self.durability == 'commit':
+            sync_file(part.path)
+        if self.store is not None:
+            final_path, duplicate_of = self.store.commit(part.path, part.target_path, sha256)
+        else:
+            os.replace(part.path, part.target_path)
+            final_path, duplicate_of = part.target_path, None
+        if self.durability == 'commit':
+            sync_dir(os.path.dirname(part.target_path))
+        part.discard_meta()
+        return final_path, duplicate_of
+
+    # Where the catalog, or the content store for a duplicate it dropped, says this map was already saved
+    def known_path(self, map_info: dict):
+        if self.catalog is not None and map_info.get('DetailsUrl'):
+            path = self.catalog.existing_path(map_info['DetailsUrl'])
+            if path:
+                return path
+        return self.store.resolve(self.target_path(map_info)) if self.store is not None else None
+
+    # Cost of a map for the 'eta' order: bytes still to fetch, spread over the connections it will
+    # get. A map already on disk costs nothing and a .part file counts as fetched; None if unknown.
+    def expected_cost(self, map_info: dict):
+        target_path = self.target_path(map_info)
+        if os.path.exists(target_path) or self.known_path(map_info):
+            return 0
+        part = PartFile(target_path)
+        size = expected_size(map_info) or part.meta.get('total')
+        if not size:
+            return None
+        if not part.offset and self.segments > 1 and size >= max(self.segment_threshold, self.segments):
+            return size / self.segments
+        return max(0, size - part.offset)
+
+    # HEAD request for the size of an archive whose size no listing gave; the catalog keeps it for later runs
+    def probe_map(self, map_info: dict) -> dict:
+        if expected_size(map_info) is not None or os.path.exists(self.target_path(map_info)) \
+                or self.known_path(map_info):
+            return map_info
+        try:
+            resp = self.request_with_backoff(map_info['DownloadUrl'], method='HEAD', allow_redirects=True)
+            size = int(resp.headers.get('Content-Length') or 0) if resp.status_code == 200 else 0
+        except Exception as e:
+            self.log(f"[WARN] No size for {map_info['Name']}: {e}", 'warning')
+            return map_info
+        if not size:
+            return map_info
+        if self.catalog is not None and map_info.get('DetailsUrl'):
+            self.catalog.set_size(map_info['DetailsUrl'], size)
+        return {**map_info, 'ProbedSize': size}
+
+    # Each connection fetches one byte range and writes it at its offset in the .part file
+    def download_segmented(self, map_name: str, map_url: str, part: PartFile, headers) -> tuple[int, str]:
+        from .segmented import SegmentedDownload
+        # A segmented .part has holes, so it is written without a .meta sidecar and never resumed
+        part.discard()
+        total = int(headers['Content-Length'])
+        self.log(f"[SEGMENTED] {map_name}: {total // 1024} KB over {self.segments} connections", 'info')
+        # Bytes are credited to the worker that owns the map; segments may report out of order
+        received = self.metrics.bytes.labels(threading.current_thread().name)
+        counted = [0]
+        lock = threading.Lock()
+
+        def progress(done, size):
+            with lock:
+                if done > counted[0]:
+                    received.inc(done - counted[0])
+                    counted[0] = done
+            self.report_progress(map_name, done, size)
+        segmented = SegmentedDownload(
+            self.request_with_backoff, map_url, part.path, total, self.segments,
+            validator=headers.get('ETag') or headers.get('Last-Modified'),
+            progress_fn=progress,
+            should_stop=lambda: self.stopped,
+            sizer_fn=self.chunk_sizer,
+            # All segments of a map are one flow, so splitting an archive doesn't buy it a bigger share
+            throttle_fn=lambda nbytes: self.throttle(nbytes, map_name)
+        )
+        try:
+            sha256 = segmented.run()
+        except Exception:
+            part.discard()
+            raise
+        return total, sha256
+
+    def record_result(self, map_info: dict, ok: bool, detail: str, size: int = None, sha256: str = None):
+        if not ok and self.failed_manifest is not None:
+            self.failed_manifest.put(map_info)
+        if self.journal is not None:
+            self.journal.result(map_info, ok, detail)
+        if ok and self.installer is not None:
+            self.installer.submit(detail, map_info)
+        if self.catalog is None or not map_info.get('DetailsUrl'):
+            return
+        if ok:
+            self.catalog.mark_downloaded(map_info['DetailsUrl'], detail, size, sha256)
+        else:
+            self.catalog.mark_failed(map_info['DetailsUrl'], detail)
+
+    # When the archive was deleted after unpacking, the catalog keeps the map's folder so it is not fetched again
+    def on_installed(self, archive: str, ok: bool, message: str, map_info: dict, folder: str):
+        self.log(f"[{'INSTALLED' if ok else 'INSTALL FAILED'}] {os.path.basename(archive)}: {message}",
+                 'success' if ok else 'error')
+        if ok and not os.path.exists(archive) and self.catalog is not None and map_info.get('DetailsUrl'):
+            self.catalog.set_path(map_info['DetailsUrl'], folder)
+
+    def scrape_page(self, page: int, players: int) -> list:
+        url = f"{self.BASE_URL}/maps/generals/zerohour-maps.aspx?page={page}&players={players}"
+        if self.page_cache is None:
+            resp = self.request_with_backoff(url)
+            return [self.build_map_info(link, players) for link in self.parse_links(resp.text)]
+        # Conditional GET: on 304 reuse the stored map entries without parsing the page
+        resp = self.request_with_backoff(url, headers=self.page_cache.conditional_headers(url))
+        if resp.status_code == 304:
+            cached = self.page_cache.revalidated(url)
+            if cached is not None:
+                self.log(f"[CACHE] Page {page} not modified", 'info')
+                return cached
+            resp = self.request_with_backoff(url)
+        maps_list = [self.build_map_info(link, players) for link in self.parse_links(resp.text)]
+        self.page_cache.put(url, resp.headers, maps_list)
+        return maps_list
+
+    def parse_links(self, html: str) -> list:
+        started = time.perf_counter()
+        links = self.get_maps_urls(html)
+        self.metrics.parse_seconds.observe(time.perf_counter() - started)
+        return links
+
+    def build_map_info(self, link: tuple, players: int) -> dict:
+        name, href = link
+        return {
+            'Name': name,
+            'Players': players,
+            'DetailsUrl': self.BASE_URL + href,
+            'DownloadUrl': self.BASE_URL + href.replace('details', 'fetch')
+        }
+
+    # Details pages are needed when they are cached, when a filter looks at them or for the 'newest' order
+    @property
+    def wants_details(self) -> bool:
+        return self.details_cache is not None or (self.map_filter is not None and self.map_filter.active) \
+            or self.order == 'newest'
+
+    def map_details(self, map_info: dict) -> dict:
+        url = map_info.get('DetailsUrl')
+        if not url:
+            return {}
+        details = self.details_cache.get(url) if self.details_cache is not None else None
+        if details is None:
+            from .mapdetails import extract_details
+            resp = self.request_with_backoff(url)
+            details = extract_details(resp.text, url)
+            if self.details_cache is not None:
+                self.details_cache.put(url, details)
+        return details
+
+    def enrich_map(self, map_info: dict) -> dict:
+        try:
+            return {**map_info, **self.map_details(map_info)}
+        except Exception as e:
+            self.log(f"[WARN] No details for {map_info['Name']}: {e}", 'warning')
+            return map_info
+
+    # Add details-page metadata in parallel, drop what the filter rejects and probe the sizes of
+    # the rest, before anything is scheduled
+    def select_maps(self, maps_list: list) -> list:
+        import concurrent.futures
+        if self.wants_details and maps_list:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.details_workers,
+                                                       thread_name_prefix='details') as executor:
+                maps_list = list(executor.map(self.enrich_map, maps_list))
+        maps_list = self.filter_maps(maps_list)
+        if self.probe_sizes and any(expected_size(m) is None for m in maps_list):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.details_workers,
+                                                       thread_name_prefix='probe') as executor:
+                maps_list = list(executor.map(self.probe_map, maps_list))
+        return maps_list
+
+    def filter_maps(self, maps_list: list) -> list:
+        if self.map_filter is None:
+            return maps_list
+        selected = [m for m in maps_list if self.map_filter.accepts(m)]
+        if len(selected) < len(maps_list):
+            self.metrics.maps.labels('filtered').inc(len(maps_list) - len(selected))
+        return selected
+
+    # Record the page's maps in the catalog; in incremental mode a page with no new maps ends the crawl.
+    # Player-count filters overlap, so a map another filter listed earlier in this crawl is still new.
+    def catalog_page(self, page: int, maps_list: list) -> bool:
+        if self.catalog is None:
+            return True
+        new_maps = self.catalog.record_seen(maps_list, since=self.crawl_started)
+        self.log(f"[INFO] Page {page}: {len(new_maps)} new of {len(maps_list)} maps", 'info')
+        if self.incremental and maps_list and not new_maps:
+            self.log(f"[INFO] Page {page} has no new maps, stopping crawl", 'info')
+            return False
+        return True
+
+    # Producer: fetches listing pages and fills the download queue. The delay between pages only
+    # slows the scraper. Pages of every selected player count are interleaved, and a map listed
+    # under several counts is queued once.
+    def produce_maps(self, jobs: queue.Queue):
+        scheduler = self.crawl_scheduler()
+        for m in self.resumed_maps():
+            if self.stopped:
+                return
+            jobs.put(m)
+        first = True
+        while not self.stopped:
+            nxt = scheduler.next_page()
+            if nxt is None:
+                break
+            players, page = nxt
+            if not first:
+                self.metrics.sleep('page_delay', random.uniform(2, 5))
+                if self.stopped:
+                    break
+            first = False
+            more = True
+            try:
+                self.log(f"[INFO] Processing page {page}/{self.max_pages} ({players} players)", 'info')
+                maps_list = self.scrape_page(page, players)
+                if not maps_list:
+                    # An empty page is the end of the list for this player count
+                    self.log(f"[INFO] No maps found on page {page} ({players} players)", 'info')
+                more = bool(maps_list) and self.catalog_page(page, maps_list)
+                for m in self.select_maps(scheduler.unseen(maps_list)):
+                    if self.stopped:
+                        break
+                    self.journal_queued(m)
+                    jobs.put(m)
+                # A page cut short by stop() is not recorded, so a resume fetches it again
+                if not self.stopped:
+                    self.journal_page(players, page, more)
+            except Exception as e:
+                self.page_failed(players, page, e)
+            scheduler.page_done(players, page, more)
+
+    # Page schedule for a new crawl; when resuming, pages recorded in the journal are skipped
+    def crawl_scheduler(self) -> CrawlScheduler:
+        self.crawl_started = time.time()
+        self.failed_pages = []
+        scheduler = CrawlScheduler(self.player_counts, self.start_page, self.max_pages)
+        if self.journal is not None:
+            state = self.journal.state
+            scheduler.restore(state.next_pages(), state.maps)
+        return scheduler
+
+    # The crawl goes on with the other pages; callers that can retry the whole crawl check failed_pages
+    def page_failed(self, players: int, page: int, error: Exception):
+        self.failed_pages.append((players, page, str(error)))
+        self.log(f"[ERROR] Page {page} ({players} players): {error}", 'error')
+
+    # Maps the previous run queued but never finished
+    def resumed_maps(self) -> list:
+        if self.journal is None:
+            return []
+        pending = self.journal.state.outstanding()
+        if pending:
+            self.log(f"[RESUME] Rescheduling {len(pending)} maps from the journal", 'info')
+        return pending
+
+    def journal_queued(self, m: dict):
+        if self.journal is not None:
+            self.journal.queued(m)
+
+    def journal_page(self, players: int, page: int, more: bool):
+        if self.journal is not None:
+            self.journal.page(players, page, more)
+
+    def log_result(self, name: str, ok: bool, msg: str):
+        if ok:
+            with self._count_lock:
+                self.total_downloaded += 1
+            self.log(f"[OK] {name}: {msg}", 'success')
+        elif not self.stopped:
+            self.log(f"[FAIL] {name}: {msg}", 'error')
+
+    # Consumer: a long-lived worker that takes the next map off the queue until the end marker (None)
+    def download_worker(self, jobs: queue.Queue):
+        while True:
+            m = jobs.get()
+            if m is None:
+                return
+            # Each download holds a limiter slot for its whole transfer
+            with self.request_slot():
+                name, ok, msg = self.download_map(m)
+            self.log_result(name, ok, msg)
+
+    # Maps the download queue holds before the producer blocks
+    def queue_window(self) -> int:
+        window = self.max_workers * self.QUEUE_DEPTH_PER_WORKER
+        return max(window, self.SCHEDULE_WINDOW) if self.order != 'page' else window
+
+    # Download queue between the producer and the workers: bounded, and ordered by self.order
+    def map_queue(self) -> MapQueue:
+        return MapQueue(self.queue_window(), self.order, cost=self.expected_cost)
+
+    # Runs the producer and the worker pool joined by the download queue
+    def run_jobs(self, producer):
+        import concurrent.futures
+        self.total_downloaded = 0
+        jobs = self.map_queue()
+        self.metrics.queue_depth.set_function(jobs.qsize)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='worker') as executor:
+            workers = [executor.submit(self.download_worker, jobs) for _ in range(self.pool_size)]
+            try:
+                producer(jobs)
+            finally:
+                for _ in workers:
+                    jobs.put(None)
+
+    # Listing pages are fetched while earlier maps download, through one bounded queue and one pool
+    def download_all_maps(self):
+        self.run_jobs(self.produce_maps)
+        self.crawl_finished()
+
+    def crawl_finished(self):
+        if self.stopped:
+            self.log(f"[STOPPED] Process stopped by user. Downloaded: {self.total_downloaded}", 'warning')
+            return
+        if self.journal is not None:
+            self.journal.end()
+        self.log(f"[DONE] Download completed! Total maps: {self.total_downloaded}", 'success')
+        reuse = self.metrics.connection_reuse()
+        if reuse['requests']:
+            self.log(f"[POOL] {reuse['requests']} requests over {reuse['connections']} connections "
+                     f"({reuse['reuse_ratio']:.0%} reused)", 'info')
+
+    # A ready list of maps (from the catalog or a manifest), without fetching listing pages
+    def download_maps(self, maps_list: list):
+        # A ready list is ranked as a whole, so the first workers already start on the right maps
+        if self.order != 'page':
+            maps_list = sorted(maps_list, key=MapRanking(self.order, self.expected_cost).key)
+
+        def produce(jobs):
+            for m in maps_list:
+                if self.stopped:
+                    return
+                jobs.put(m)
+        self.run_jobs(produce)
+
+    def download_from_catalog(self):
+        self.download_maps(self.catalog.pending_maps(players=self.player_counts))
+
+    # Dry run: fetch listing pages only and write the maps to a manifest instead of downloading them
+    def export_manifest(self, path: str) -> int:
+        from .manifest import ManifestWriter
+        with ManifestWriter(path) as writer:
+            self.produce_maps(writer)
+        return writer.count
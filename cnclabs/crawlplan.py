@@ -0,0 +1,65 @@
+import collections
+
+
+def parse_int_ranges(text) -> list:
+    """Parse ``"8"``, ``"2,4,8"`` or ``"2-8"`` (or any mix) into a sorted list of unique ints."""
+    values = set()
+    for part in str(text).replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            low, high = part.split('-', 1)
+            low, high = int(low), int(high)
+            if low > high:
+                raise ValueError(f"Invalid range: {part}")
+            values.update(range(low, high + 1))
+        else:
+            values.add(int(part))
+    if not values:
+        raise ValueError(f"No values in {text!r}")
+    return sorted(values)
+
+
+class CrawlScheduler:
+    """Round-robin over listing pages of several player-count filters in a single crawl.
+
+    ``next_page`` hands out one (players, page) at a time, cycling through the filters so the
+    download queue is fed from all of them at once. A filter drops out when it passes ``last_page``,
+    returns an empty page, or the caller says it has nothing more to find. ``unseen`` removes maps
+    already queued from another filter, keyed by their details URL.
+    """
+
+    def __init__(self, player_counts, first_page: int = 1, last_page: int = 10):
+        self.last_page = last_page
+        self.cursors = collections.OrderedDict((players, first_page) for players in player_counts)
+        self._seen = set()
+
+    def restore(self, next_pages: dict, seen_keys=()):
+        """Continue an earlier crawl: ``next_pages`` maps players to the next page, or None if finished."""
+        for players in list(self.cursors):
+            if players not in next_pages:
+                continue
+            page = next_pages[players]
+            if page is None or page > self.last_page:
+                del self.cursors[players]
+            else:
+                self.cursors[players] = max(page, self.cursors[players])
+        self._seen.update(seen_keys)
+
+    def next_page(self):
+        if not self.cursors:
+            return None
+        return self.cursors.popitem(last=False)
+
+    def page_done(self, players: int, page: int, more: bool = True):
+        if more and page < self.last_page:
+            self.cursors[players] = page + 1
+
+    def unseen(self, maps_list: list) -> list:
+        fresh = []
+        for m in maps_list:
+            key = m.get('DetailsUrl') or m['DownloadUrl']
+            if key not in self._seen:
+                self._seen.add(key)
+                fresh.append(m)
+        return fresh
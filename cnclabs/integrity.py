@@ -0,0 +1,106 @@
+import os
+import threading
+import zipfile
+
+# Map packs that are not zips still start with one of these signatures
+ARCHIVE_MAGIC = (b'PK\x03\x04', b'PK\x05\x06', b'Rar!\x1a\x07', b'7z\xbc\xaf\x27\x1c')
+
+
+def validate_archive(path: str, full: bool = False):
+    """Raise if ``path`` is not a usable map archive.
+
+    Zips are opened to parse the central directory (cheap, no second pass over the data);
+    ``full`` additionally checks every member's CRC. Rar/7z archives are only checked by
+    signature, which is still enough to reject an HTML error page saved as a map.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if not head.startswith(ARCHIVE_MAGIC):
+        raise Exception("Downloaded file is not a map archive")
+    if not head.startswith(b'PK'):
+        return
+    try:
+        with zipfile.ZipFile(path) as zf:
+            if not zf.infolist():
+                raise Exception("Zip archive is empty")
+            if full:
+                bad = zf.testzip()
+                if bad is not None:
+                    raise Exception(f"Corrupt zip member: {bad}")
+    except zipfile.BadZipFile as e:
+        raise Exception(f"Invalid zip archive: {e}")
+
+
+class ContentStore:
+    """Content-addressed index of downloaded archives keyed by SHA-256.
+
+    ``<root>/<aa>/<sha256>`` is a hardlink to the first file seen with that content and
+    ``<sha256>.ref`` records that file's path. A later download with the same hash becomes another
+    hardlink to it (``link=True``) or is dropped, with the existing file reported instead
+    (``link=False``). On filesystems without hardlinks only the ``.ref`` file is kept. A dropped
+    duplicate leaves ``names/<file name>`` holding its hash, so later runs know the map is already
+    there without a catalog.
+    """
+
+    def __init__(self, root: str, link: bool = True):
+        self.root = root
+        self.link = link
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def name_path(self, target_path: str) -> str:
+        return os.path.join(self.root, 'names', os.path.basename(target_path))
+
+    # Where the content of a duplicate that was not stored under ``target_path`` lives, if anywhere
+    def resolve(self, target_path: str):
+        try:
+            with open(self.name_path(target_path), 'r', encoding='utf-8') as f:
+                sha256 = f.read().strip()
+        except OSError:
+            return None
+        return self.lookup(sha256) if sha256 else None
+
+    # Prefer the user-visible original; fall back to the store's own link if it was renamed/deleted
+    def lookup(self, sha256: str):
+        obj = self.object_path(sha256)
+        try:
+            with open(obj + '.ref', 'r', encoding='utf-8') as f:
+                path = f.read().strip()
+            if os.path.exists(path):
+                return path
+        except OSError:
+            pass
+        return obj if os.path.exists(obj) else None
+
+    def commit(self, part_path: str, target_path: str, sha256: str) -> tuple[str, str]:
+        """Move a verified download into place; returns (path now holding the map, duplicate-of or None)."""
+        with self._lock:
+            existing = self.lookup(sha256)
+            if existing:
+                os.remove(part_path)
+                if self.link:
+                    try:
+                        os.link(existing, target_path)
+                        return target_path, existing
+                    except OSError:
+                        pass
+                name = self.name_path(target_path)
+                os.makedirs(os.path.dirname(name), exist_ok=True)
+                with open(name, 'w', encoding='utf-8') as f:
+                    f.write(sha256)
+                return existing, existing
+            os.replace(part_path, target_path)
+            obj = self.object_path(sha256)
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            try:
+                if os.path.exists(obj):
+                    os.remove(obj)
+                os.link(target_path, obj)
+            except OSError:
+                pass
+            with open(obj + '.ref', 'w', encoding='utf-8') as f:
+                f.write(os.path.abspath(target_path))
+            return target_path, None
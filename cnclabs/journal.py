@@ -0,0 +1,132 @@
+"""Append-only crawl journal so an interrupted crawl can resume where it stopped.
+
+Every listing page fetched, map queued, map completed and map failed is appended as one JSON
+line. Events are buffered and written (and fsynced) in batches, so the journal costs one write
+per batch rather than one per map. A lost tail only means a little work is redone. On
+``resume=True`` the existing file is replayed: pages already fetched are skipped and maps that
+were queued but never completed are scheduled again.
+"""
+import json
+import os
+import threading
+import time
+
+
+def map_key(m: dict) -> str:
+    return m.get('DetailsUrl') or m['DownloadUrl']
+
+
+class JournalState:
+    """What a replayed journal says about the previous run."""
+
+    def __init__(self):
+        # players -> (last page fetched, whether that page said there is more)
+        self.pages = {}
+        self.maps = {}
+        self.completed = set()
+        self.failed = {}
+        self.ended = False
+
+    def apply(self, event: dict):
+        kind = event.get('e')
+        if kind == 'page':
+            players, page = event['players'], event['page']
+            last = self.pages.get(players)
+            if last is None or page >= last[0]:
+                self.pages[players] = (page, event['more'])
+        elif kind == 'queued':
+            self.maps[map_key(event['map'])] = event['map']
+        elif kind == 'done':
+            self.completed.add(event['key'])
+            self.failed.pop(event['key'], None)
+        elif kind == 'failed':
+            self.failed[event['key']] = event.get('error')
+        elif kind == 'end':
+            self.ended = True
+
+    def outstanding(self) -> list:
+        """Maps queued but not completed (failed ones included, so they are retried)."""
+        return [m for key, m in self.maps.items() if key not in self.completed]
+
+    # players -> next page to fetch, or None when that filter was finished
+    def next_pages(self) -> dict:
+        return {players: page + 1 if more else None for players, (page, more) in self.pages.items()}
+
+
+class CrawlJournal:
+    def __init__(self, path: str, resume: bool = False, batch_size: int = 64, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.state = JournalState()
+        if resume and os.path.exists(path):
+            self.state, good_bytes = self.replay(path)
+            # Cut off a torn last line so new events don't get appended after garbage
+            with open(path, 'r+b') as f:
+                f.truncate(good_bytes)
+        if self.state.ended:
+            # The previous crawl finished; resuming it would do nothing, so start a new one
+            self.state = JournalState()
+            resume = False
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def replay(path: str) -> tuple[JournalState, int]:
+        """Return the replayed state and the length of the intact prefix of the file."""
+        state = JournalState()
+        good_bytes = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete line")
+                    state.apply(json.loads(line))
+                except (ValueError, KeyError):
+                    # A torn last line from a crash; everything before it is intact
+                    break
+                good_bytes += len(line)
+        return state, good_bytes
+
+    def append(self, event: dict):
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._file.write(''.join(self._buffer))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def page(self, players: int, page: int, more: bool):
+        self.append({'e': 'page', 'players': players, 'page': page, 'more': bool(more)})
+
+    def queued(self, m: dict):
+        self.append({'e': 'queued', 'map': m})
+
+    def result(self, m: dict, ok: bool, detail: str = None):
+        if ok:
+            self.append({'e': 'done', 'key': map_key(m)})
+        else:
+            self.append({'e': 'failed', 'key': map_key(m), 'error': detail})
+
+    # Mark the crawl as finished; a later --resume then starts a fresh crawl
+    def end(self):
+        self.append({'e': 'end'})
+        self.flush()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._file.close()
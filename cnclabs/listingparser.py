@@ -0,0 +1,112 @@
+"""Extract ``a.DisplayName`` map links from zerohour-maps.aspx listing pages.
+
+The listing only matters for its map anchors, so instead of building a full BeautifulSoup tree
+the page is fed through lxml's pull parser in chunks: each ``<a>`` is inspected as soon as it is
+closed and then freed together with everything parsed before it. The result is a list of plain
+``(name, href)`` tuples that keeps no reference to the document. If lxml is unavailable a
+``html.parser`` based scanner gives the same output. lxml is imported on the first parse, not
+at import time, so front ends that never parse a page don't pay for it.
+"""
+from html.parser import HTMLParser
+
+etree = None
+_lxml_checked = False
+
+CLASS_NAME = 'DisplayName'
+FEED_SIZE = 64 * 1024
+
+
+def _load_lxml():
+    global etree, _lxml_checked
+    if not _lxml_checked:
+        try:
+            from lxml import etree
+        except ImportError:  # pragma: no cover - lxml is in requirements.txt
+            etree = None
+        _lxml_checked = True
+    return etree
+
+
+def _has_class(value) -> bool:
+    return bool(value) and CLASS_NAME in value.split()
+
+
+def extract_map_links_lxml(html) -> list:
+    etree = _load_lxml()
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    parser = etree.HTMLPullParser(events=('end',), tag='a', encoding='utf-8')
+    links = []
+    for start in range(0, len(html), FEED_SIZE):
+        parser.feed(html[start:start + FEED_SIZE])
+        _collect(parser, links)
+    parser.close()
+    _collect(parser, links)
+    return links
+
+
+def _collect(parser, links: list):
+    for _, el in parser.read_events():
+        if _has_class(el.get('class')) and el.get('href'):
+            links.append((''.join(el.itertext()), el.get('href')))
+        # Free the anchor and every finished subtree before it (earlier rows, headers, scripts)
+        el.clear()
+        for node in [el, *el.iterancestors()]:
+            parent = node.getparent()
+            if parent is None:
+                # The root's siblings (a leading comment, an <?xml ?> PI) aren't deletable
+                break
+            while node.getprevious() is not None:
+                del parent[0]
+
+
+class _DisplayNameScanner(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self._href = None
+        self._depth = 0
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        if self._href is not None:
+            self._depth += 1
+            return
+        attrs = dict(attrs)
+        if _has_class(attrs.get('class')) and attrs.get('href'):
+            self._href = attrs['href']
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag != 'a' or self._href is None:
+            return
+        if self._depth:
+            self._depth -= 1
+            return
+        self.links.append((''.join(self._text), self._href))
+        self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+
+def extract_map_links_stdlib(html) -> list:
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    scanner = _DisplayNameScanner()
+    for start in range(0, len(html), FEED_SIZE):
+        scanner.feed(html[start:start + FEED_SIZE])
+    scanner.close()
+    return scanner.links
+
+
+def extract_map_links(html) -> list:
+    """Return ``[(name, href), ...]`` for every ``a.DisplayName`` on a listing page."""
+    if not html:
+        return []
+    if _load_lxml() is not None:
+        return extract_map_links_lxml(html)
+    return extract_map_links_stdlib(html)
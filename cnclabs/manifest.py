@@ -0,0 +1,102 @@
+"""Map manifests: the list of maps to download, as JSON Lines or CSV.
+
+Each record has ``name`` and ``fetch_url`` and optionally ``details_url``, ``players``, ``size``
+and ``sha256``, plus the details-page metadata (``author``, ``rating``, ``uploaded``,
+``listed_size``, ``description``, ``preview``) when it was fetched. A manifest can come from a scrape-only dry run, a catalog export or a previous
+run's failures, and can be split between machines with ``select_shard``. ``priority`` (higher
+first) and ``probed_size`` steer the download order.
+"""
+import csv
+import json
+import threading
+import zlib
+
+FIELDS = ('name', 'fetch_url', 'details_url', 'players', 'size', 'sha256',
+          'author', 'rating', 'uploaded', 'listed_size', 'description', 'preview', 'probed_size', 'priority')
+# manifest field -> key in the downloader's map dicts
+MAP_KEYS = {'name': 'Name', 'fetch_url': 'DownloadUrl', 'details_url': 'DetailsUrl', 'players': 'Players',
+            'size': 'Size', 'sha256': 'SHA256', 'author': 'Author', 'rating': 'Rating', 'uploaded': 'Uploaded',
+            'listed_size': 'ListedSize', 'description': 'Description', 'preview': 'Preview',
+            'probed_size': 'ProbedSize', 'priority': 'Priority'}
+
+
+def is_csv(path: str) -> bool:
+    return path.lower().endswith('.csv')
+
+
+def record_to_map(record: dict) -> dict:
+    if not record.get('name') or not record.get('fetch_url'):
+        raise ValueError(f"Manifest entry needs 'name' and 'fetch_url': {record}")
+    m = {}
+    for field, key in MAP_KEYS.items():
+        value = record.get(field)
+        if value in (None, ''):
+            continue
+        if field in ('players', 'size', 'listed_size', 'probed_size', 'priority'):
+            value = int(value)
+        elif field == 'rating':
+            value = float(value)
+        m[key] = value
+    return m
+
+
+def map_to_record(m: dict) -> dict:
+    return {field: m.get(key) for field, key in MAP_KEYS.items()}
+
+
+def read_manifest(path: str) -> list:
+    """Return the manifest's entries as map dicts, in file order."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if is_csv(path):
+            return [record_to_map(row) for row in csv.DictReader(f)]
+        return [record_to_map(json.loads(line)) for line in f if line.strip()]
+
+
+def select_shard(maps_list: list, index: int, count: int) -> list:
+    """Maps belonging to shard ``index`` of ``count`` (1-based), by a stable hash of the fetch URL."""
+    return [m for m in maps_list if zlib.crc32(m['DownloadUrl'].encode('utf-8')) % count == index - 1]
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    index, count = (int(x) for x in text.split('/'))
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {text}, expected K/N with 1 <= K <= N")
+    return index, count
+
+
+class ManifestWriter:
+    """Append map dicts to a manifest as they arrive; safe to share between threads.
+
+    ``put`` mirrors ``queue.Queue.put`` so a writer can stand in for the download queue of
+    ``produce_maps`` in a scrape-only run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._csv = None
+        if is_csv(path):
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDS)
+            self._csv.writeheader()
+
+    def put(self, m: dict):
+        record = map_to_record(m)
+        with self._lock:
+            if self._csv is not None:
+                self._csv.writerow(record)
+            else:
+                self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class MapCatalog:
+    """SQLite record of every map seen on the listing pages and its download state."""
+    STATUS_PENDING = 'pending'
+    STATUS_DOWNLOADED = 'downloaded'
+    STATUS_FAILED = 'failed'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS maps (
+            details_url TEXT PRIMARY KEY,
+            fetch_url   TEXT NOT NULL,
+            players     INTEGER,
+            name        TEXT NOT NULL,
+            first_seen  REAL NOT NULL,
+            last_seen   REAL NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'pending',
+            size        INTEGER,
+            sha256      TEXT,
+            path        TEXT,
+            error       TEXT
+        );
+        CREATE INDEX IF NOT EXISTS maps_status ON maps (status, players);
+        CREATE TABLE IF NOT EXISTS map_players (
+            details_url TEXT NOT NULL,
+            players     INTEGER NOT NULL,
+            PRIMARY KEY (details_url, players)
+        );
+    """
+
+    def __init__(self, path: str = "catalog.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        # Several processes may share one catalog (sharded crawl); wait for their write locks
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+        # Catalogs written before map_players existed know one player count per map
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO map_players SELECT details_url, players FROM maps "
+                               "WHERE players IS NOT NULL")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Upsert a page worth of maps; returns the ones that were not in the catalog before, or that
+    # were first seen at or after ``since`` (earlier in the same crawl, under another filter).
+    # A map keeps the first player count it was listed under; every count goes to map_players.
+    def record_seen(self, maps_list: list, since: float = None) -> list:
+        now = time.time()
+        new_maps = []
+        with self._lock, self._conn:
+            for m in maps_list:
+                row = self._conn.execute("SELECT first_seen FROM maps WHERE details_url = ?",
+                                         (m['DetailsUrl'],)).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO maps (details_url, fetch_url, players, name, first_seen, last_seen) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (m['DetailsUrl'], m['DownloadUrl'], m.get('Players'), m['Name'], now, now))
+                    new_maps.append(m)
+                else:
+                    # Name and links only come from a sighting while no listing has given a player count
+                    self._conn.execute(
+                        "UPDATE maps SET last_seen = ?, "
+                        "name = CASE WHEN players IS NULL THEN ? ELSE name END, "
+                        "fetch_url = CASE WHEN players IS NULL THEN ? ELSE fetch_url END, "
+                        "players = COALESCE(players, ?) WHERE details_url = ?",
+                        (now, m['Name'], m['DownloadUrl'], m.get('Players'), m['DetailsUrl']))
+                    if since is not None and row['first_seen'] >= since:
+                        new_maps.append(m)
+                if m.get('Players') is not None:
+                    self._conn.execute("INSERT OR IGNORE INTO map_players (details_url, players) VALUES (?, ?)",
+                                       (m['DetailsUrl'], m['Players']))
+        return new_maps
+
+    # Maps asked for by URL alone: added when unknown, never changing what a listing recorded
+    def record_unlisted(self, maps_list: list):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO maps (details_url, fetch_url, players, name, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(m['DetailsUrl'], m['DownloadUrl'], m.get('Players'), m['Name'], now, now) for m in maps_list])
+
+    def mark_downloaded(self, details_url: str, path: str, size: int = None, sha256: str = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE maps SET status = ?, path = ?, size = COALESCE(?, size), sha256 = COALESCE(?, sha256), "
+                "error = NULL WHERE details_url = ?",
+                (self.STATUS_DOWNLOADED, path, size, sha256, details_url))
+
+    def mark_failed(self, details_url: str, error: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE maps SET status = ?, error = ? WHERE details_url = ?",
+                               (self.STATUS_FAILED, error, details_url))
+
+    # Where a map already downloaded earlier lives now (possibly under another name after dedup)
+    def existing_path(self, details_url: str):
+        row = self.get(details_url)
+        if row is None or row['status'] != self.STATUS_DOWNLOADED or not row['path']:
+            return None
+        return row['path'] if os.path.exists(row['path']) else None
+
+    # Archive size from a HEAD probe, kept so later runs can order pending maps without probing again
+    def set_size(self, details_url: str, size: int):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE maps SET size = ? WHERE details_url = ? AND status != ?",
+                               (size, details_url, self.STATUS_DOWNLOADED))
+
+    # The archive was unpacked and removed; remember the installed folder instead
+    def set_path(self, details_url: str, path: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE maps SET path = ? WHERE details_url = ?", (path, details_url))
+
+    def get(self, details_url: str):
+        with self._lock:
+            return self._conn.execute("SELECT * FROM maps WHERE details_url = ?", (details_url,)).fetchone()
+
+    # Maps still to download, in the same dict shape download_map expects
+    def pending_maps(self, players=None, include_failed: bool = True) -> list:
+        statuses = [self.STATUS_PENDING, self.STATUS_FAILED] if include_failed else [self.STATUS_PENDING]
+        sql = f"SELECT * FROM maps WHERE status IN ({','.join('?' * len(statuses))})"
+        params = list(statuses)
+        if players is not None:
+            players = [players] if isinstance(players, int) else list(players)
+            sql += (" AND details_url IN (SELECT details_url FROM map_players "
+                    f"WHERE players IN ({','.join('?' * len(players))}))")
+            params.extend(players)
+        sql += " ORDER BY first_seen"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self.row_to_map(row) for row in rows]
+
+    @staticmethod
+    def row_to_map(row) -> dict:
+        m = {
+            'Name': row['name'],
+            'Players': row['players'],
+            'DownloadUrl': row['fetch_url'],
+            'DetailsUrl': row['details_url'],
+        }
+        # A pending map's size is a probed one: good for ordering, not for checking the download
+        if row['size']:
+            m['ProbedSize'] = row['size']
+        return m
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM maps GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
@@ -0,0 +1,246 @@
+"""Map details pages: metadata extraction, an on-disk cache and filters.
+
+A listing page only gives a map's name and links. Its ``details.aspx`` page also has the author,
+rating, upload date, description, preview image and file size. ``extract_details`` pulls those out
+with a single ``html.parser`` pass, ``DetailsCache`` keeps the result per map ID so re-runs don't
+fetch the same page again, and ``MapFilter`` decides from the metadata whether a map is downloaded.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urljoin, urlparse
+
+# metadata key -> words looked for in an element's id/class
+FIELD_HINTS = {
+    'Author': ('author', 'uploader', 'creator'),
+    'Rating': ('rating',),
+    'Uploaded': ('dateadded', 'uploaded', 'uploaddate', 'date'),
+    'Description': ('description',),
+    'ListedSize': ('filesize', 'size'),
+}
+# "Label: value" lines used when the markup has no telling ids
+TEXT_LABELS = {
+    'Author': re.compile(r'^(?:author|uploaded by|created by)\s*:?\s*(.+)$', re.I),
+    'Rating': re.compile(r'^rating\s*:?\s*(.+)$', re.I),
+    'Uploaded': re.compile(r'^(?:date added|uploaded|upload date|added|date)\s*:?\s*(.+)$', re.I),
+    'ListedSize': re.compile(r'^(?:file size|size)\s*:?\s*(.+)$', re.I),
+}
+PREVIEW_HINTS = ('preview', 'screenshot', 'thumb', 'mapimage')
+DATE_FORMATS = ('%m/%d/%Y', '%Y-%m-%d', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y')
+SIZE_UNITS = {'b': 1, 'bytes': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+MAX_DESCRIPTION = 1000
+
+
+def map_id(details_url: str) -> str:
+    """The ``id`` query parameter of a details URL, or a hash of the URL when it has none."""
+    ids = parse_qs(urlparse(details_url).query).get('id')
+    if ids and re.fullmatch(r'[\w-]+', ids[0]):
+        return ids[0]
+    return hashlib.sha1(details_url.encode('utf-8')).hexdigest()
+
+
+def parse_rating(text: str):
+    match = re.search(r'\d+(?:\.\d+)?', text or '')
+    return float(match.group()) if match else None
+
+
+def parse_date(text: str):
+    """ISO date (YYYY-MM-DD) from the formats the site uses; a trailing time is ignored."""
+    text = (text or '').strip()
+    for candidate in (text, text.split(' ')[0], ' '.join(text.split(' ')[:3])):
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(candidate.strip(), fmt).date().isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_size(text: str):
+    match = re.search(r'([\d.,]+)\s*(bytes|[kmg]?b)\b', text or '', re.I)
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1).replace(',', '')) * SIZE_UNITS[match.group(2).lower()])
+    except ValueError:
+        return None
+
+
+def _field_for(attrs: dict):
+    marker = f"{attrs.get('id') or ''} {attrs.get('class') or ''}".lower()
+    if not marker.strip():
+        return None
+    for key, hints in FIELD_HINTS.items():
+        if any(hint in marker for hint in hints):
+            return key
+    return None
+
+
+class _DetailsScanner(HTMLParser):
+    VOID = {'br', 'img', 'input', 'meta', 'link', 'hr', 'area', 'base', 'col', 'source', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields = {}
+        self.preview = None
+        self.og_image = None
+        self.lines = []
+        self._open = []  # (tag, field or None, collected text)
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'img' and self.preview is None:
+            marker = f"{attrs.get('id') or ''} {attrs.get('class') or ''} {attrs.get('src') or ''}".lower()
+            if attrs.get('src') and any(hint in marker for hint in PREVIEW_HINTS):
+                self.preview = attrs['src']
+        if tag == 'meta' and attrs.get('property') == 'og:image' and attrs.get('content'):
+            self.og_image = attrs['content']
+        if tag in ('br', 'p', 'div', 'tr', 'li', 'td', 'th'):
+            self._break()
+        if tag in self.VOID:
+            return
+        field = _field_for(attrs)
+        self._open.append((tag, field if field not in self.fields else None, []))
+
+    def handle_endtag(self, tag):
+        if tag in ('p', 'div', 'tr', 'li', 'td', 'th'):
+            self._break()
+        # Close up to the matching tag; real pages are not always well nested
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i][0] == tag:
+                for _, field, text in self._open[i:]:
+                    value = ' '.join(''.join(text).split())
+                    if field and value and field not in self.fields:
+                        self.fields[field] = value
+                del self._open[i:]
+                return
+
+    def handle_data(self, data):
+        self._line.append(data)
+        for _, field, text in self._open:
+            if field:
+                text.append(data)
+
+    def _break(self):
+        line = ' '.join(''.join(self._line).split())
+        if line:
+            self.lines.append(line)
+        self._line = []
+
+    def close(self):
+        super().close()
+        self._break()
+
+
+def extract_details(html, page_url: str = '') -> dict:
+    """Return the metadata found on a details page; keys that could not be found are left out."""
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    scanner = _DetailsScanner()
+    scanner.feed(html or '')
+    scanner.close()
+    raw = dict(scanner.fields)
+    for line in scanner.lines:
+        for key, pattern in TEXT_LABELS.items():
+            if key not in raw:
+                match = pattern.match(line)
+                if match:
+                    raw[key] = match.group(1).strip()
+    details = {}
+    if raw.get('Author'):
+        # An id-matched element may hold the label as well ("Author: name")
+        match = TEXT_LABELS['Author'].match(raw['Author'])
+        details['Author'] = match.group(1).strip() if match else raw['Author']
+    if parse_rating(raw.get('Rating')) is not None:
+        details['Rating'] = parse_rating(raw['Rating'])
+    if parse_date(raw.get('Uploaded')):
+        details['Uploaded'] = parse_date(raw['Uploaded'])
+    if raw.get('Description'):
+        details['Description'] = raw['Description'][:MAX_DESCRIPTION]
+    if parse_size(raw.get('ListedSize')) is not None:
+        details['ListedSize'] = parse_size(raw['ListedSize'])
+    preview = scanner.preview or scanner.og_image
+    if preview:
+        details['Preview'] = urljoin(page_url, preview)
+    return details
+
+
+class DetailsCache:
+    """Parsed details pages on disk, one small JSON file per map ID, valid for ``ttl`` seconds."""
+
+    def __init__(self, directory: str = ".details-cache", ttl: float = 30 * 24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, details_url: str) -> str:
+        return os.path.join(self.directory, map_id(details_url) + '.json')
+
+    def get(self, details_url: str):
+        try:
+            with open(self._path(details_url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        fresh = entry is not None and time.time() - entry.get('stored_at', 0) <= self.ttl
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry['details'] if fresh else None
+
+    def put(self, details_url: str, details: dict):
+        path = self._path(details_url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': details_url, 'stored_at': time.time(), 'details': details}, f)
+        os.replace(tmp_path, path)
+
+
+class MapFilter:
+    """Which maps to download, judged on their details metadata.
+
+    A map missing a field that a filter needs is rejected: an unrated map does not pass
+    ``min_rating`` and a map without an upload date does not pass ``since``/``until``.
+    """
+
+    def __init__(self, min_rating: float = None, since: str = None, until: str = None, author: str = None,
+                 max_size: int = None):
+        self.min_rating = min_rating
+        self.since = since
+        self.until = until
+        self.author = author.lower() if author else None
+        self.max_size = max_size
+
+    # Whether a details page has to be fetched to apply this filter
+    @property
+    def active(self) -> bool:
+        return any(v is not None for v in (self.min_rating, self.since, self.until, self.author, self.max_size))
+
+    def accepts(self, m: dict) -> bool:
+        if self.min_rating is not None and (m.get('Rating') is None or m['Rating'] < self.min_rating):
+            return False
+        if self.since is not None and (not m.get('Uploaded') or m['Uploaded'] < self.since):
+            return False
+        if self.until is not None and (not m.get('Uploaded') or m['Uploaded'] > self.until):
+            return False
+        if self.author is not None and self.author not in (m.get('Author') or '').lower():
+            return False
+        if self.max_size is not None and (m.get('ListedSize') is None or m['ListedSize'] > self.max_size):
+            return False
+        return True
+
+
+def iso_date(text: str) -> str:
+    """argparse type for --since/--until."""
+    return datetime.date.fromisoformat(text).isoformat()
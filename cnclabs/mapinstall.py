@@ -0,0 +1,148 @@
+"""Unpack downloaded map archives into the game's Maps folder while downloads continue.
+
+Archives are handed to a small pool of extraction threads, so unzipping overlaps with the
+network-bound download workers. Entries are streamed to disk in blocks (never read whole into
+memory), every entry path is checked to stay inside the Maps folder, and a file that is already
+installed with the same size and CRC-32 is left untouched.
+"""
+import os
+import posixpath
+import queue
+import shutil
+import threading
+import zipfile
+import zlib
+
+COPY_BUFFER = 1024 * 1024
+
+
+class UnsafeArchive(Exception):
+    pass
+
+
+def crc32_of(path: str) -> int:
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(COPY_BUFFER)
+            if not block:
+                return crc
+            crc = zlib.crc32(block, crc)
+
+
+def safe_member_path(root: str, name: str) -> str:
+    """Destination of archive entry ``name`` under ``root``; raises UnsafeArchive if it escapes it."""
+    name = name.replace('\\', '/')
+    parts = [p for p in posixpath.normpath(name).split('/') if p not in ('', '.')]
+    if name.startswith('/') or not parts or parts[0] == '..' or ':' in parts[0]:
+        raise UnsafeArchive(f"Unsafe path in archive: {name!r}")
+    target = os.path.realpath(os.path.join(root, *parts))
+    if os.path.commonpath([target, os.path.realpath(root)]) != os.path.realpath(root):
+        raise UnsafeArchive(f"Unsafe path in archive: {name!r}")
+    return target
+
+
+def install_archive(archive: str, maps_dir: str) -> tuple[str, int, int]:
+    """Extract one zip into ``maps_dir``; returns (map folder, files written, files already installed).
+
+    A zip whose entries all sit in one top-level folder is extracted as is (the usual
+    ``MapName/MapName.map`` layout); loose files go into a folder named after the archive.
+    """
+    written = skipped = 0
+    with zipfile.ZipFile(archive) as zf:
+        members = [m for m in zf.infolist() if not m.is_dir()]
+        if not members:
+            raise Exception("Archive has no files")
+        tops = {m.filename.replace('\\', '/').lstrip('/').split('/', 1)[0] for m in members}
+        nested = len(tops) == 1 and all('/' in m.filename.replace('\\', '/').strip('/') for m in members)
+        root = maps_dir if nested else os.path.join(maps_dir, os.path.splitext(os.path.basename(archive))[0])
+        # Check every path before writing anything
+        targets = [(m, safe_member_path(root, m.filename)) for m in members]
+        for member, target in targets:
+            if os.path.isfile(target) and os.path.getsize(target) == member.file_size \
+                    and crc32_of(target) == member.CRC:
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = target + '.extracting'
+            try:
+                with zf.open(member) as src, open(tmp, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, COPY_BUFFER)
+                os.replace(tmp, target)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            written += 1
+    folder = os.path.join(maps_dir, tops.pop()) if nested else root
+    return folder, written, skipped
+
+
+class MapInstaller:
+    """Background extraction pool fed with finished archives.
+
+    ``submit`` never blocks the download workers; ``close`` waits until everything submitted has
+    been processed. With ``after='delete'`` an archive is removed once it is fully installed.
+    ``on_result(archive, ok, message, tag, folder)`` is called from the extraction threads.
+    """
+
+    def __init__(self, maps_dir: str, workers: int = 2, after: str = 'keep', on_result=None):
+        self.maps_dir = maps_dir
+        self.after = after
+        self.on_result = on_result
+        self.installed = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._seen = set()
+        os.makedirs(maps_dir, exist_ok=True)
+        self._threads = [threading.Thread(target=self._run, name=f'installer-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    # tag is passed back to on_result untouched (the downloader uses the map's info)
+    def submit(self, archive: str, tag=None):
+        # Already-installed maps whose archive was deleted are recorded by their folder
+        if not os.path.isfile(archive):
+            return
+        # The same file can be reported twice (dedup links, skip-existing); install it once
+        with self._lock:
+            key = os.path.abspath(archive)
+            if key in self._seen:
+                return
+            self._seen.add(key)
+        self._queue.put((archive, tag))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            archive, tag = item
+            try:
+                if not zipfile.is_zipfile(archive):
+                    raise Exception("Not a zip archive, install it by hand")
+                folder, written, skipped = install_archive(archive, self.maps_dir)
+                if self.after == 'delete':
+                    os.remove(archive)
+                with self._lock:
+                    self.installed += 1
+                self._report(archive, True, f"{written} files installed, {skipped} already present", tag, folder)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                self._report(archive, False, str(e), tag, None)
+
+    def _report(self, archive: str, ok: bool, message: str, tag, folder):
+        if self.on_result is not None:
+            try:
+                self.on_result(archive, ok, message, tag, folder)
+            except Exception:
+                pass
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
@@ -0,0 +1,84 @@
+"""Download scheduling: which queued map a free worker takes next.
+
+Workers pull from one priority queue instead of taking maps in the order the pages listed them.
+A user-assigned ``Priority`` (higher first) always wins; among maps of the same priority the
+``order`` decides:
+
+    page      the order the maps were found in
+    smallest  smallest archive first
+    eta       shortest expected transfer first (the downloader's ``expected_cost``: bytes still to
+              fetch, so a map already on disk or mostly resumed goes early)
+    newest    most recently uploaded first (needs the details pages)
+
+Sizes come from a manifest (``Size``), a HEAD probe or the catalog (``ProbedSize``) or the details
+page (``ListedSize``). Maps whose size or date is unknown go after the others, in page order.
+"""
+import datetime
+import heapq
+import itertools
+import queue
+
+ORDERS = ('page', 'smallest', 'eta', 'newest')
+# Sorts after every map, so the workers' end markers (None) come out last
+END = (1,)
+
+
+def expected_size(m: dict):
+    """Best known archive size of a map in bytes, or None."""
+    return m.get('Size') or m.get('ProbedSize') or m.get('ListedSize')
+
+
+class MapRanking:
+    """Sort key of a queued item; ``cost`` is used by the ``eta`` order, ``unpack`` finds the map
+    in an item that is not a bare map dict (the service queues ``(job, map)`` pairs)."""
+
+    def __init__(self, order: str = 'page', cost=None, unpack=None):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order {order!r}, expected one of {', '.join(ORDERS)}")
+        self.order = order
+        self.cost = cost or expected_size
+        self.unpack = unpack
+
+    def key(self, item) -> tuple:
+        if item is None:
+            return END
+        m = self.unpack(item) if self.unpack is not None else item
+        priority = -int(m.get('Priority') or 0)
+        if self.order == 'smallest':
+            value = expected_size(m)
+        elif self.order == 'eta':
+            value = self.cost(m)
+        elif self.order == 'newest':
+            try:
+                value = -datetime.date.fromisoformat(m['Uploaded']).toordinal()
+            except (KeyError, TypeError, ValueError):
+                value = None
+        else:
+            return (0, priority)
+        return (0, priority, value is None, value or 0)
+
+
+class MapQueue(queue.Queue):
+    """Bounded priority queue of maps with the interface of ``queue.Queue``; ties keep insertion order."""
+
+    def __init__(self, maxsize: int = 0, order: str = 'page', cost=None, unpack=None):
+        self.ranking = MapRanking(order, cost, unpack)
+        super().__init__(maxsize)
+
+    # Ranked before the queue's lock is taken: the cost may look at the disk and the catalog
+    def put(self, item, block: bool = True, timeout: float = None):
+        super().put((self.ranking.key(item), item), block, timeout)
+
+    def _init(self, maxsize):
+        self.queue = []
+        self._seq = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, entry):
+        key, item = entry
+        heapq.heappush(self.queue, (key, next(self._seq), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[-1]
@@ -0,0 +1,320 @@
+"""In-process metrics with Prometheus text exposition and a periodic JSON dump.
+
+Only what the downloader needs: labelled counters, gauges (optionally read from a callback at
+collection time) and cumulative histograms. Updates take one small lock, so they are cheap enough
+to call once per received chunk.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAP_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yield (suffix, label values, extra labels, value)."""
+        for values, child in sorted(self._children.items()):
+            yield '', values, (), child.value
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self, lock):
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value(threading.Lock())
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def total(self) -> float:
+        return sum(child.value for child in list(self._children.values()))
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._function = None
+
+    def _new_child(self):
+        return _Value(threading.Lock())
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    # Read the value at collection time instead (queue sizes, limiter state)
+    def set_function(self, fn):
+        self._function = fn
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                yield '', (), (), float(self._function())
+            except Exception:
+                pass
+            return
+        yield from super().samples()
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    # Linear interpolation inside the bucket holding the q-th observation
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                yield '_bucket', values, (('le', '+Inf' if bound == float('inf') else f'{bound:g}'),), cumulative
+            yield '_sum', values, (), total
+            yield '_count', values, (), count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for suffix, values, extra, value in m.samples():
+                lines.append(f"{m.name}{suffix}{_format_labels(m.labelnames, values, extra)} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """Plain dict of every sample, keyed by metric name then label string."""
+        out = {}
+        for m in self.metrics:
+            series = out.setdefault(m.name, {})
+            for suffix, values, extra, value in m.samples():
+                key = suffix + _format_labels(m.labelnames, values, extra)
+                series[key or 'value'] = value
+        return out
+
+
+class DownloaderMetrics:
+    """Every metric the engines update, on one registry.
+
+    Requests are split by ``kind`` ("listing" for zerohour-maps.aspx pages, "details" for details
+    pages, "fetch" for archives, "probe" for HEAD requests that learn an archive's size).
+    Sleep time is split by ``reason``: backoff after a 429, after a 5xx, after a connection error,
+    the politeness delay between listing pages, and waiting for the bandwidth limit.
+    Connection pools count, by host, the requests they send and the connections they open.
+    """
+
+    def __init__(self):
+        self.registry = Registry()
+        r = self.registry.register
+        self.requests = r(Counter('cnclabs_requests_total', 'HTTP responses by request kind and status',
+                                  ('kind', 'status')))
+        self.request_seconds = r(Histogram('cnclabs_request_seconds', 'Time from request to response headers',
+                                           ('kind',), LATENCY_BUCKETS))
+        self.retries = r(Counter('cnclabs_retries_total', 'Retried requests by cause', ('reason',)))
+        self.sleep_seconds = r(Counter('cnclabs_sleep_seconds_total', 'Time spent sleeping by cause', ('reason',)))
+        self.bytes = r(Counter('cnclabs_bytes_total', 'Archive bytes received per worker', ('worker',)))
+        self.maps = r(Counter('cnclabs_maps_total', 'Finished maps by result', ('result',)))
+        self.map_seconds = r(Histogram('cnclabs_map_seconds', 'Wall time per downloaded map', (), MAP_BUCKETS))
+        self.parse_seconds = r(Histogram('cnclabs_parse_seconds', 'Listing page parse time', (), PARSE_BUCKETS))
+        self.queue_depth = r(Gauge('cnclabs_queue_depth', 'Maps waiting in the download queue'))
+        self.concurrency = r(Gauge('cnclabs_concurrency_limit', 'Current adaptive concurrency limit'))
+        self.in_flight = r(Gauge('cnclabs_in_flight', 'Downloads and requests holding a limiter slot'))
+        self.bandwidth_limit = r(Gauge('cnclabs_bandwidth_limit_bytes',
+                                       'Bandwidth limit in force in bytes per second (0 = unlimited)'))
+        self.pool_requests = r(Counter('cnclabs_pool_requests_total', 'Requests sent over pooled connections by host',
+                                       ('host',)))
+        self.connections = r(Counter('cnclabs_connections_opened_total',
+                                     'New connections (TCP and TLS handshakes) by host', ('host',)))
+        self.connection_reuse_ratio = r(Gauge('cnclabs_connection_reuse_ratio',
+                                              'Share of requests sent over an already open connection'))
+        self.connection_reuse_ratio.set_function(lambda: self.connection_reuse()['reuse_ratio'] or 0)
+        self.started = time.time()
+
+    def sleep(self, reason: str, seconds: float):
+        time.sleep(seconds)
+        self.sleep_seconds.labels(reason).inc(seconds)
+
+    def connection_reuse(self) -> dict:
+        """Requests, new connections and the share of requests that reused a connection, overall and by host."""
+        hosts = {}
+        for (host,), child in list(self.pool_requests._children.items()):
+            hosts[host] = [int(child.value), 0]
+        for (host,), child in list(self.connections._children.items()):
+            hosts.setdefault(host, [0, 0])[1] = int(child.value)
+
+        def summary(sent, opened):
+            reused = max(0, sent - opened)
+            return {'requests': sent, 'connections': opened, 'reused': reused,
+                    'reuse_ratio': round(reused / sent, 3) if sent else None}
+        stats = summary(sum(s for s, _ in hosts.values()), sum(o for _, o in hosts.values()))
+        stats['hosts'] = {host: summary(s, o) for host, (s, o) in sorted(hosts.items())}
+        return stats
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    def snapshot(self) -> dict:
+        data = self.registry.snapshot()
+        data['uptime_seconds'] = time.time() - self.started
+        return data
+
+
+class MetricsDumper:
+    """Write ``snapshot()`` plus per-worker and total bytes/s to a JSON file every ``interval`` seconds."""
+
+    def __init__(self, metrics: DownloaderMetrics, path: str, interval: float = 10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._last = ({}, time.monotonic())
+        self._thread = threading.Thread(target=self._run, name='metrics-dump', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.dump()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        data = self.metrics.snapshot()
+        now = time.monotonic()
+        per_worker = {values[0]: child.value for values, child in list(self.metrics.bytes._children.items())}
+        last, then = self._last
+        elapsed = max(now - then, 1e-9)
+        rates = {w: (v - last.get(w, 0.0)) / elapsed for w, v in per_worker.items()}
+        data['bytes_per_second'] = {'total': sum(rates.values()), 'workers': rates}
+        self._last = (per_worker, now)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+def serve_metrics(metrics: DownloaderMetrics, host: str = '127.0.0.1', port: int = 9108):
+    """Serve ``GET /metrics`` on a background thread; returns the server (``port=0`` picks a free port)."""
+    import http.server
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
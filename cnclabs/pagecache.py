@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class PageCache:
+    """On-disk cache of listing pages: HTTP validators plus the map entries parsed from the body.
+
+    A 304 reply lets the caller reuse the stored entries without downloading or parsing the page again.
+    Entries older than ``ttl`` seconds are dropped, and the oldest entries are evicted once the
+    directory grows past ``max_bytes``.
+    """
+    EVICT_EVERY = 50
+
+    def __init__(self, directory: str = ".page-cache", ttl: float = 7 * 24 * 3600, max_bytes: int = 50 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.evict()
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url: str):
+        path = self._path(url)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.ttl:
+            self._remove(path)
+            return None
+        return entry
+
+    # If-None-Match / If-Modified-Since for a cached page, empty when there is nothing to revalidate
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    # Entries for a page the server answered with 304; refreshes the entry's age
+    def revalidated(self, url: str):
+        entry = self.get(url)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        entry['stored_at'] = time.time()
+        self._write(url, entry)
+        with self._lock:
+            self.hits += 1
+        return entry['maps']
+
+    def put(self, url: str, headers, maps_list: list):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        with self._lock:
+            self.misses += 1
+        if not etag and not last_modified:
+            return
+        self._write(url, {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': time.time(),
+            'maps': maps_list,
+        })
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def _write(self, url: str, entry: dict):
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # Drop expired entries, then the least recently stored ones until under the size cap
+    def evict(self):
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > self.ttl:
+                self._remove(path)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
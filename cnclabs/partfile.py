@@ -0,0 +1,173 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+
+from .streamio import PREALLOCATE, preallocate
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+class PartFile:
+    """Resume state of an interrupted download: ``<target>.part`` plus a small ``.part.meta`` sidecar.
+
+    The sidecar keeps the validators (ETag / Last-Modified) of the response the partial bytes came
+    from, so a resumed request can send ``If-Range`` and the server falls back to a full 200 reply
+    whenever the archive changed in the meantime.
+
+    While a transfer runs the file may be preallocated to the full archive size; it is cut back to
+    the bytes actually written when the transfer ends. A ``.part`` still marked as preallocated
+    was left by a crash, so its length says nothing about what arrived. Every ``CHECKPOINT_BYTES``
+    the data is synced and the offset recorded as ``written``; a crashed transfer resumes from there.
+    """
+    CHECKPOINT_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, target_path: str):
+        self.target_path = target_path
+        self.path = target_path + '.part'
+        self.meta_path = self.path + '.meta'
+        self.offset = 0
+        self.meta = {}
+        if os.path.exists(self.path):
+            self.offset = os.path.getsize(self.path)
+            try:
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    self.meta = json.load(f)
+            except (OSError, ValueError):
+                self.meta = {}
+        # A crash during a preallocated transfer: only the synced high-water mark is known to be good
+        if self.meta.get('preallocated'):
+            self.offset = min(self.offset, int(self.meta.get('written') or 0))
+        # Without a validator we cannot tell whether the bytes on disk still match the remote file
+        if self.offset and not self.validator():
+            self.offset = 0
+
+    def validator(self):
+        return self.meta.get('etag') or self.meta.get('last_modified')
+
+    def request_headers(self) -> dict:
+        if not self.offset:
+            return {}
+        return {'Range': f'bytes={self.offset}-', 'If-Range': self.validator()}
+
+    # A 206 is only usable when it continues exactly at our offset and matches the stored size
+    def accepts(self, status: int, headers) -> bool:
+        if not self.offset or status != 206:
+            return False
+        match = CONTENT_RANGE_RE.match(headers.get('Content-Range', ''))
+        if not match or int(match.group(1)) != self.offset:
+            return False
+        total = match.group(3)
+        if total != '*' and self.meta.get('total') and int(total) != self.meta['total']:
+            return False
+        etag = headers.get('ETag')
+        if etag and self.meta.get('etag') and etag != self.meta['etag']:
+            return False
+        return True
+
+    # Total archive size for progress reporting, from either a 200 or a 206 response
+    @staticmethod
+    def total_size(status: int, headers) -> int:
+        if status == 206:
+            match = CONTENT_RANGE_RE.match(headers.get('Content-Range', ''))
+            if match and match.group(3) != '*':
+                return int(match.group(3))
+        return int(headers.get('Content-Length', 0) or 0)
+
+    # Start over: forget the partial bytes and remember the validators of the fresh response
+    def restart(self, headers):
+        self.offset = 0
+        self.meta = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'total': int(headers.get('Content-Length', 0) or 0) or None,
+        }
+        self.save_meta()
+
+    # Written next to the sidecar and renamed over it, so a crash never leaves half a file
+    def save_meta(self):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    # Make the bytes so far durable, then record how far they go
+    def checkpoint(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+        self.meta['written'] = f.tell()
+        self.save_meta()
+
+    # SHA-256 state primed with the bytes already on disk
+    def digest(self):
+        digest = hashlib.sha256()
+        if self.offset:
+            with open(self.path, 'rb') as f:
+                remaining = self.offset
+                while remaining:
+                    chunk = f.read(min(1024 * 1024, remaining))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+        return digest
+
+    # The file positioned at the resume offset; with the archive size known, the rest of it is reserved up front
+    @contextlib.contextmanager
+    def open(self, total: int = 0):
+        f = open(self.path, 'r+b' if self.offset else 'wb')
+        reserved = False
+        try:
+            f.seek(self.offset)
+            f.truncate()
+            if PREALLOCATE and total > self.offset:
+                self.meta['preallocated'] = True
+                self.meta['written'] = self.offset
+                self.save_meta()
+                reserved = preallocate(f, total)
+                f.seek(self.offset)
+            yield _CheckpointedFile(self, f) if reserved else f
+        finally:
+            if self.meta.pop('preallocated', None):
+                self.meta.pop('written', None)
+                if reserved:
+                    f.truncate()
+                self.save_meta()
+            f.close()
+
+    # Drop any partial bytes; used when the file will be written by other means
+    def discard(self):
+        self.offset = 0
+        self.meta = {}
+        for path in (self.path, self.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def discard_meta(self):
+        try:
+            os.remove(self.meta_path)
+        except OSError:
+            pass
+
+
+class _CheckpointedFile:
+    """Write side of a preallocated ``.part``: checkpoints the resume offset every ``CHECKPOINT_BYTES``."""
+
+    def __init__(self, part: PartFile, f):
+        self._part = part
+        self._f = f
+        self._unsynced = 0
+
+    def write(self, data) -> int:
+        n = self._f.write(data)
+        self._unsynced += n
+        if self._unsynced >= self._part.CHECKPOINT_BYTES:
+            self._part.checkpoint(self._f)
+            self._unsynced = 0
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
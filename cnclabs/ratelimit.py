@@ -0,0 +1,195 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+# The slot the current thread/task already holds, so nested requests don't deadlock. Segment
+# threads run in a copy of their download's context and share its hold.
+_held = contextvars.ContextVar('adaptive_limiter_held', default=None)
+
+
+class _Hold:
+    def __init__(self):
+        self.held = True
+        self.lock = threading.Lock()
+
+
+def parse_retry_after(value) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or 0."""
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        import email.utils
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return max(0.0, when.timestamp() - time.time())
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit shared by every request a downloader makes.
+
+    Healthy responses grow the limit by one slot per ``increase_interval`` seconds; a 429 or 5xx
+    halves it (at most once per ``cooldown`` seconds, so one burst of errors counts once). A
+    ``Retry-After`` header pauses all new requests until it has elapsed, instead of letting every
+    thread sleep and then retry at the same moment. A download backing off gives its slot up
+    (``released``) and takes it back through ``acquire``, so its retry obeys both.
+    """
+
+    def __init__(self, initial: int = 3, minimum: int = 1, maximum: int = 10, decrease: float = 0.5,
+                 cooldown: float = 1.0, increase_interval: float = 1.0, on_change=None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.increase_interval = increase_interval
+        self.on_change = on_change
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.successes = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._last_increase = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    # Seconds to wait before a slot may be taken, 0 when one is free (caller holds the lock)
+    def _wait_time(self) -> float:
+        pause = self.blocked_until - time.monotonic()
+        if pause > 0:
+            return pause
+        return 0.0 if self.in_flight < int(self.limit) else None
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._wait_time()
+                if wait == 0.0:
+                    self.in_flight += 1
+                    return
+                self._cond.wait(wait)
+
+    def try_acquire(self):
+        """Take a slot without blocking; returns None on success, else seconds to wait (or None if unknown)."""
+        with self._cond:
+            wait = self._wait_time()
+            if wait == 0.0:
+                self.in_flight += 1
+                return None
+            return wait if wait is not None else 0.05
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    async def acquire_async(self):
+        import asyncio
+        while True:
+            wait = self.try_acquire()
+            if wait is None:
+                return
+            await asyncio.sleep(min(wait, 0.25))
+
+    @contextlib.contextmanager
+    def slot(self):
+        if _held.get() is not None:
+            yield
+            return
+        self.acquire()
+        hold = _Hold()
+        token = _held.set(hold)
+        try:
+            yield
+        finally:
+            _held.reset(token)
+            if hold.held:
+                self.release()
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self):
+        if _held.get() is not None:
+            yield
+            return
+        await self.acquire_async()
+        hold = _Hold()
+        token = _held.set(hold)
+        try:
+            yield
+        finally:
+            _held.reset(token)
+            if hold.held:
+                self.release()
+
+    # Give up the current slot while backing off and wait for a new one (limit and pause) afterwards
+    @contextlib.contextmanager
+    def released(self):
+        hold = _held.get()
+        if hold is None:
+            yield
+            return
+        with hold.lock:
+            if hold.held:
+                hold.held = False
+                self.release()
+        try:
+            yield
+        finally:
+            with hold.lock:
+                if not hold.held:
+                    self.acquire()
+                    hold.held = True
+
+    @contextlib.asynccontextmanager
+    async def async_released(self):
+        hold = _held.get()
+        if hold is None:
+            yield
+            return
+        # One event loop thread: no other task touches this hold between the checks
+        if hold.held:
+            hold.held = False
+            self.release()
+        try:
+            yield
+        finally:
+            if not hold.held:
+                await self.acquire_async()
+                hold.held = True
+
+    # Feed a response status back into the limit; returns the Retry-After delay in seconds
+    def record(self, status: int, retry_after=None) -> float:
+        delay = parse_retry_after(retry_after)
+        with self._cond:
+            old = self.current
+            now = time.monotonic()
+            if status == 429 or 500 <= status < 600:
+                self.throttled += 1
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+                if delay:
+                    self.blocked_until = max(self.blocked_until, now + delay)
+            else:
+                self.successes += 1
+                # Only probe upwards after a full quiet interval since the last change
+                if now - max(self._last_increase, self._last_decrease) >= self.increase_interval:
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._last_increase = now
+            changed = self.current != old
+            self._cond.notify_all()
+        if changed and self.on_change:
+            self.on_change(old, self.current)
+        return delay
+
+    # Connection errors count as congestion but carry no Retry-After
+    def record_error(self):
+        self.record(503)
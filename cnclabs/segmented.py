@@ -0,0 +1,108 @@
+import concurrent.futures
+import contextvars
+import hashlib
+import os
+import threading
+
+from .partfile import CONTENT_RANGE_RE
+from .streamio import ChunkSizer, preallocate, read_chunks
+
+
+class SegmentedDownload:
+    """Fetch one archive over several connections, each pulling its own byte range.
+
+    The target file is preallocated to the full size and every segment reads into its own buffer
+    and writes at its own offset through a private file handle. The result is verified
+    (per-segment byte counts and final file size) before the caller commits it.
+    """
+
+    def __init__(self, request_fn, url: str, path: str, total: int, segments: int, validator: str = None,
+                 progress_fn=None, should_stop=None, throttle_fn=None, sizer_fn=None):
+        self.request_fn = request_fn
+        self.url = url
+        self.path = path
+        self.total = total
+        self.segments = max(1, min(segments, total))
+        self.validator = validator
+        self.progress_fn = progress_fn
+        self.should_stop = should_stop
+        self.throttle_fn = throttle_fn
+        self.sizer_fn = sizer_fn or ChunkSizer
+        self.downloaded = 0
+        self.failed = False
+        self._lock = threading.Lock()
+
+    # Only worth it for large files on servers that advertise byte ranges
+    @staticmethod
+    def eligible(status: int, headers, segments: int, threshold: int) -> bool:
+        if segments <= 1 or status != 200:
+            return False
+        if headers.get('Accept-Ranges', '').lower() != 'bytes':
+            return False
+        total = int(headers.get('Content-Length', 0) or 0)
+        return total >= max(threshold, segments)
+
+    def ranges(self) -> list:
+        size = self.total // self.segments
+        bounds = []
+        for i in range(self.segments):
+            start = i * size
+            end = self.total - 1 if i == self.segments - 1 else start + size - 1
+            bounds.append((start, end))
+        return bounds
+
+    def fetch_segment(self, start: int, end: int) -> int:
+        headers = {'Range': f'bytes={start}-{end}'}
+        if self.validator:
+            headers['If-Range'] = self.validator
+        r = self.request_fn(self.url, stream=True, headers=headers)
+        try:
+            match = CONTENT_RANGE_RE.match(r.headers.get('Content-Range', ''))
+            if r.status_code != 206 or not match or int(match.group(1)) != start or int(match.group(2)) != end:
+                raise Exception(f"Server refused range {start}-{end} (HTTP {r.status_code})")
+            written = 0
+            with open(self.path, 'r+b') as f:
+                f.seek(start)
+                for chunk in read_chunks(r, self.sizer_fn()):
+                    if self.failed:
+                        raise Exception("Aborted: another segment failed")
+                    if self.should_stop and self.should_stop():
+                        raise Exception("Stopped by user")
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+                        with self._lock:
+                            self.downloaded += len(chunk)
+                            downloaded = self.downloaded
+                        if self.progress_fn:
+                            self.progress_fn(downloaded, self.total)
+                        if self.throttle_fn:
+                            self.throttle_fn(len(chunk))
+        finally:
+            r.close()
+        if written != end - start + 1:
+            raise Exception(f"Segment {start}-{end} incomplete: {written} of {end - start + 1} bytes")
+        return written
+
+    # Returns the SHA-256 of the assembled file
+    def run(self) -> str:
+        with open(self.path, 'wb') as f:
+            if not preallocate(f, self.total):
+                f.truncate(self.total)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.segments) as executor:
+            # Segments run inside the caller's context so they share its concurrency slot
+            futures = [executor.submit(contextvars.copy_context().run, self.fetch_segment, start, end)
+                       for start, end in self.ranges()]
+            try:
+                for fut in concurrent.futures.as_completed(futures):
+                    fut.result()
+            except Exception:
+                self.failed = True
+                raise
+        if os.path.getsize(self.path) != self.total:
+            raise Exception(f"Assembled file is {os.path.getsize(self.path)} bytes, expected {self.total}")
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
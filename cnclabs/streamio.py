@@ -0,0 +1,92 @@
+"""Archive write path: large reads into one reusable buffer, preallocated targets, fsync at commit.
+
+A transfer reads the response body with ``readinto`` into a ``bytearray`` owned by the transfer,
+and every chunk is written, hashed and counted through a ``memoryview`` of that buffer. The read
+size adapts to the link: it grows while reads return quickly and shrinks when one takes long, so
+a fast link pays few Python iterations per megabyte and a slow one still reports progress (and
+notices a stop) several times a second.
+
+Durability modes, applied when a finished archive is moved into place:
+
+    off     leave flushing to the operating system (fastest; a power cut can lose recent maps)
+    commit  fsync the archive before the rename and its folder after it
+"""
+import errno
+import os
+import time
+
+DURABILITY = ('off', 'commit')
+IDENTITY = ('', 'identity')
+# Not available on Windows and macOS; targets there are simply grown as they are written
+PREALLOCATE = hasattr(os, 'posix_fallocate')
+
+
+class ChunkSizer:
+    """Read size for one transfer: doubles after a read faster than ``target`` seconds, halves
+    after one slower than twice that, within ``minimum``..``maximum`` bytes."""
+
+    def __init__(self, initial: int = 64 * 1024, minimum: int = 16 * 1024, maximum: int = 1024 * 1024,
+                 target: float = 0.1):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.size = min(max(initial, minimum), self.maximum)
+        self.target = target
+
+    def update(self, nbytes: int, seconds: float):
+        if nbytes >= self.size and seconds < self.target:
+            self.size = min(self.size * 2, self.maximum)
+        elif seconds > self.target * 2:
+            self.size = max(self.size // 2, self.minimum)
+
+
+def read_chunks(resp, sizer: ChunkSizer = None):
+    """Body of a streamed ``requests`` response as memoryviews over one reusable buffer.
+
+    Each view is only valid until the next one is taken, so write and hash it before moving on.
+    A compressed body (Content-Encoding) is decoded by requests' own iterator instead.
+    """
+    sizer = sizer or ChunkSizer()
+    raw = resp.raw
+    if resp.headers.get('Content-Encoding', '').strip().lower() not in IDENTITY or not hasattr(raw, 'readinto'):
+        yield from resp.iter_content(sizer.size)
+        return
+    view = memoryview(bytearray(sizer.maximum))
+    while True:
+        started = time.perf_counter()
+        n = raw.readinto(view[:sizer.size])
+        if not n:
+            return
+        sizer.update(n, time.perf_counter() - started)
+        yield view[:n]
+
+
+def preallocate(f, size: int) -> bool:
+    """Reserve ``size`` bytes for ``f`` on disk (extending it to that size) where the platform
+    supports it. A full disk fails here, before the transfer starts; False when nothing was reserved."""
+    if size <= 0 or not PREALLOCATE:
+        return False
+    f.flush()
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise OSError(e.errno, f"Not enough disk space for {size // 1024} KB", f.name) from None
+        # e.g. a file system without fallocate support
+        return False
+    return True
+
+
+def sync_file(path: str):
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+# Makes a rename inside the folder durable; folders can't be opened for that on Windows
+def sync_dir(path: str):
+    if os.name == 'nt':
+        return
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
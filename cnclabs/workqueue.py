@@ -0,0 +1,206 @@
+"""SQLite work queue for splitting a crawl across processes or machines.
+
+A crawl (player counts x page range) is planned as shards of a few listing pages each. Workers
+claim a shard under a time-limited lease, renew the lease while they work and mark it done. A
+shard whose lease runs out (worker crashed, machine went away) is handed to the next worker that
+asks, up to ``max_attempts`` times. SQLite locking is the only coordination, so any process that
+can open the file can take part: local processes, or other machines on a shared filesystem.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+
+class WorkQueue:
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS shards (
+            id          INTEGER PRIMARY KEY,
+            players     INTEGER NOT NULL,
+            first_page  INTEGER NOT NULL,
+            last_page   INTEGER NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'pending',
+            owner       TEXT,
+            lease_until REAL,
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            maps_done   INTEGER,
+            error       TEXT,
+            updated     REAL,
+            UNIQUE (players, first_page)
+        );
+        CREATE INDEX IF NOT EXISTS shards_status ON shards (status, lease_until);
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit mode so claim() can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def plan(self, player_counts, first_page: int, last_page: int, pages_per_shard: int) -> int:
+        """Add the shards covering the crawl; existing shards are kept, so planning twice is harmless."""
+        added = 0
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for players in player_counts:
+                    for start in range(first_page, last_page + 1, pages_per_shard):
+                        cur = self._conn.execute(
+                            "INSERT OR IGNORE INTO shards (players, first_page, last_page, updated) VALUES (?, ?, ?, ?)",
+                            (players, start, min(last_page, start + pages_per_shard - 1), now))
+                        added += cur.rowcount
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return added
+
+    def claim(self, owner: str, lease: float):
+        """Lease the next pending (or abandoned) shard to ``owner``; returns it as a dict, or None."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM shards WHERE (status = ? OR (status = ? AND lease_until < ?)) AND attempts < ? "
+                    "ORDER BY first_page, players LIMIT 1",
+                    (self.PENDING, self.LEASED, now, self.max_attempts)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE shards SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                        "WHERE id = ?", (self.LEASED, owner, now + lease, now, row['id']))
+                # Abandoned shards that used up their attempts are given up on
+                self._conn.execute(
+                    "UPDATE shards SET status = ?, error = COALESCE(error, 'lease expired') "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (self.FAILED, self.LEASED, now, self.max_attempts))
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return dict(row) if row is not None else None
+
+    def _update_owned(self, shard_id: int, owner: str, sql: str, params: tuple) -> bool:
+        with self._lock:
+            cur = self._conn.execute(sql + " WHERE id = ? AND owner = ? AND status = ?",
+                                     params + (shard_id, owner, self.LEASED))
+        return cur.rowcount == 1
+
+    # False means the lease was lost to another worker
+    def renew(self, shard_id: int, owner: str, lease: float) -> bool:
+        now = time.time()
+        return self._update_owned(shard_id, owner, "UPDATE shards SET lease_until = ?, updated = ?",
+                                  (now + lease, now))
+
+    def complete(self, shard_id: int, owner: str, maps_done: int = None) -> bool:
+        return self._update_owned(shard_id, owner,
+                                  "UPDATE shards SET status = ?, maps_done = ?, error = NULL, updated = ?",
+                                  (self.DONE, maps_done, time.time()))
+
+    # Back to pending for another try, or failed once the attempts are used up
+    def fail(self, shard_id: int, owner: str, error: str) -> bool:
+        return self._update_owned(
+            shard_id, owner,
+            "UPDATE shards SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_until = NULL, error = ?, "
+            "updated = ?", (self.max_attempts, self.FAILED, self.PENDING, error, time.time()))
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # Shards some worker may still process (pending, or leased and possibly reassigned later)
+    def outstanding(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM shards WHERE status IN (?, ?)",
+                                     (self.PENDING, self.LEASED)).fetchone()
+        return row[0]
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseKeeper:
+    """Renews a shard's lease on a background thread while the shard is being processed."""
+
+    def __init__(self, work_queue: WorkQueue, shard_id: int, owner: str, lease: float):
+        self.work_queue = work_queue
+        self.shard_id = shard_id
+        self.owner = owner
+        self.lease = lease
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'lease-{shard_id}', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease / 3):
+            if not self.work_queue.renew(self.shard_id, self.owner, self.lease):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(downloader, work_queue: WorkQueue, owner: str = None, lease: float = 300.0,
+               poll: float = 5.0, log=print) -> int:
+    """Claim and process shards until none are left; returns the number of shards completed.
+
+    Each shard is an ordinary crawl of its page range on ``downloader`` (pages and the maps they
+    list), so retries, the limiter, the catalog and dedup all behave as in a single-process run.
+    """
+    owner = owner or default_owner()
+    completed = 0
+    while True:
+        shard = work_queue.claim(owner, lease)
+        if shard is None:
+            if not work_queue.outstanding():
+                return completed
+            # Other workers hold the remaining shards; wait in case one of them dies
+            time.sleep(poll)
+            continue
+        label = f"shard {shard['id']} ({shard['players']}P pages {shard['first_page']}-{shard['last_page']})"
+        log(f"[SHARD] {owner} took {label}")
+        downloader.player_counts = [shard['players']]
+        downloader.start_page = shard['first_page']
+        downloader.max_pages = shard['last_page']
+        done_before = downloader.metrics.maps.total()
+        try:
+            with LeaseKeeper(work_queue, shard['id'], owner, lease) as keeper:
+                downloader.download_all_maps()
+            # The crawl logs a failed listing page and moves on; the shard goes back to be retried
+            if downloader.failed_pages:
+                players, page, error = downloader.failed_pages[0]
+                raise Exception(f"{len(downloader.failed_pages)} listing page(s) failed, "
+                                f"first {players}P page {page}: {error}")
+        except Exception as e:
+            work_queue.fail(shard['id'], owner, str(e))
+            log(f"[SHARD] {label} failed: {e}")
+            continue
+        maps_done = int(downloader.metrics.maps.total() - done_before)
+        if keeper.lost or not work_queue.complete(shard['id'], owner, maps_done):
+            log(f"[SHARD] Lost the lease on {label}; another worker will redo it")
+            continue
+        completed += 1
+        log(f"[SHARD] Finished {label}")
@@ -1,178 +1,328 @@
-import requests
-import bs4
 import os
 import sys
-import time
-import re
-import random
-import concurrent.futures
-from colorama import init, Fore, Style
-from random import choice
 import argparse
+import threading
+from cnclabs.bandwidth import BandwidthSchedule, parse_rate
+from cnclabs.core import CnCLabsDownloader
+from cnclabs.crawlplan import parse_int_ranges
+from cnclabs.journal import CrawlJournal
+from cnclabs.manifest import ManifestWriter, parse_shard, read_manifest, select_shard
+from cnclabs.mapqueue import ORDERS
+from cnclabs.mapdetails import DetailsCache, MapFilter, iso_date
+from cnclabs.streamio import DURABILITY
 
-init(autoreset=True)
-
-
-class CnCLabsDownloader:
-    BASE_URL = 'https://www.cnclabs.com'
-    USER_AGENTS = [
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu Chromium/37.0.2062.94 Chrome/37.0.2062.94 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/45.0.2454.85 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko',
-        'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:40.0) Gecko/20100101 Firefox/40.0'
-    ]
-
-    def __init__(self, players: int = 8, max_pages: int = 10, download_dir: str = "downloads", max_workers: int = 3,
-                 log_callback=None, progress_callback=None):
-        self.players = players
-        self.max_pages = max_pages
-        self.download_dir = download_dir
-        self.max_workers = max_workers
-        self.log_callback = log_callback
-        self.progress_callback = progress_callback
-        os.makedirs(self.download_dir, exist_ok=True)
-        self.session = requests.Session()
-
-    # الطلب مع backoff
-    def request_with_backoff(self, url: str, max_attempts: int = 5, **kwargs):
-        attempt = 0
-        last_exc = None
-        while attempt < max_attempts:
-            attempt += 1
-            try:
-                self.session.headers.update({'user-agent': choice(self.USER_AGENTS)})
-                resp = self.session.get(url, **kwargs)
-                if resp.status_code == 429:
-                    backoff_factor = min(60, (2 ** attempt) + random.uniform(0, 1.5))
-                    print(Fore.YELLOW + f"[429] Waiting {backoff_factor:.1f}s (attempt {attempt})" + Style.RESET_ALL)
-                    time.sleep(backoff_factor)
-                    last_exc = Exception("429")
-                    continue
-                if 500 <= resp.status_code < 600:
-                    backoff_factor = min(60, (2 ** attempt) + random.uniform(0, 1.5))
-                    print(Fore.YELLOW + f"[{resp.status_code}] Server error. Waiting {backoff_factor:.1f}s" + Style.RESET_ALL)
-                    time.sleep(backoff_factor)
-                    last_exc = Exception(str(resp.status_code))
-                    continue
-                return resp
-            except requests.RequestException as e:
-                last_exc = e
-                backoff_factor = min(60, (2 ** attempt) + random.uniform(0, 1.5))
-                print(Fore.YELLOW + f"Request exception: {e}. Retrying in {backoff_factor:.1f}s" + Style.RESET_ALL)
-                time.sleep(backoff_factor)
-        raise last_exc if last_exc else Exception("Request failed")
-
-    # استخراج روابط الخرائط من الصفحة
-    @staticmethod
-    def get_maps_urls(html_content: str):
-        soup = bs4.BeautifulSoup(html_content, 'lxml')
-        elements = soup.find_all('a', class_='DisplayName')
-        return elements if elements else []
-
-    # تنظيف اسم الملف
-    @staticmethod
-    def sanitize_filename(name: str) -> str:
-        name = re.sub(r'[\\/:"*?<>|]+', '_', name).strip()
-        return name[:200] if len(name) > 200 else name
-
-    # تحميل الخريطة بشكل متدرج
-    def download_map(self, map_info: dict) -> tuple[str, bool, str]:
-        map_name = map_info['Name']
-        map_url = map_info['DownloadUrl']
-        filename = self.sanitize_filename(map_name) + '.zip'
-        target_path = os.path.join(self.download_dir, filename)
-        if os.path.exists(target_path):
-            msg = f"Skipped (exists) {target_path}"
-            return (map_name, True, msg)
-        try:
-            r = self.request_with_backoff(map_url, stream=True)
-            total_size = int(r.headers.get('Content-Length', 0) or 0)
-            downloaded = 0 # bytes
-            with open(target_path + '.part', 'wb') as f:
-                for chunk in r.iter_content(8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        self.print_progress(map_name, downloaded, total_size)
-            os.replace(target_path + '.part', target_path)
-            msg = f"Downloaded: {target_path}"
+
+# عرض رسائل المحرك وشريط التقدم في الطرفية بالألوان؛ colorama تُحمّل عند أول استخدام
+class Console:
+    COLORS = {'info': 'CYAN', 'success': 'GREEN', 'warning': 'YELLOW', 'error': 'RED'}
+    BAR_LEN = 40
+
+    def __init__(self):
+        from colorama import init, Fore, Style
+        init(autoreset=True)
+        self.fore = Fore
+        self.style = Style
+        self._lock = threading.Lock()
+        # هل السطر الحالي شريط تقدم لم ينتهِ بسطر جديد
+        self._bar = False
+
+    def log(self, message: str, level: str = 'info'):
+        color = getattr(self.fore, self.COLORS.get(level, 'RESET'))
+        with self._lock:
             try:
-                print(Fore.GREEN + f"\n{msg}" + Style.RESET_ALL)
+                print(('\n' if self._bar else '') + color + message + self.style.RESET_ALL)
             except Exception:
                 pass
-            return (map_name, True, target_path)
-        except Exception as e:
-            return (map_name, False, str(e))
-
-    def print_progress(self, name, downloaded, total):
-        if total > 0:
-            percent = min(100, downloaded * 100 / total)
-            bar_len = 40
-            filled = int(bar_len * percent / 100)
-            bar = Fore.GREEN + '=' * filled + Style.DIM + ' ' * (bar_len - filled) + Style.RESET_ALL
-            text = f"\r{Fore.CYAN}Downloading {name} {bar} {percent:.1f}%"
+            self._bar = False
+
+    def progress(self, name: str, downloaded: int, total: int):
+        percent = min(100, downloaded * 100 / total)
+        filled = int(self.BAR_LEN * percent / 100)
+        bar = self.fore.GREEN + '=' * filled + self.style.DIM + ' ' * (self.BAR_LEN - filled) + self.style.RESET_ALL
+        with self._lock:
             try:
-                # print to stdout for CLI compatibility
-                sys.stdout.write(text)
+                sys.stdout.write(f"\r{self.fore.CYAN}Downloading {name} {bar} {percent:.1f}%")
                 sys.stdout.flush()
             except Exception:
                 pass
+            self._bar = True
 
-    # تحميل جميع الخرائط
-    def download_all_maps(self):
-        page = 1
-        while page <= self.max_pages:
-            url = f"{self.BASE_URL}/maps/generals/zerohour-maps.aspx?page={page}&players={self.players}"
-            try:
-                resp = self.request_with_backoff(url)
-                elements = self.get_maps_urls(resp.text)
-                if elements:
-                    maps_list = []
-                    for e in elements:
-                        maps_list.append({
-                            'Name': e.get_text(),
-                            'Players': self.players,
-                            'DownloadUrl': self.BASE_URL + e['href'].replace('details', 'fetch')
-                        })
-                    # تحميل بالتوازي
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                        futures = [executor.submit(self.download_map, m) for m in maps_list]
-                        for fut in concurrent.futures.as_completed(futures):
-                            name, ok, msg = fut.result()
-                            color = Fore.GREEN if ok else Fore.RED
-                            try:
-                                print(color + f"[{'OK' if ok else 'FAIL'}] {name}: {msg}" + Style.RESET_ALL)
-                            except Exception:
-                                pass
-            except Exception as e:
-                try:
-                    print(Fore.RED + f"[ERROR] Page {page}: {e}" + Style.RESET_ALL)
-                except Exception:
-                    pass
-                if callable(self.log_callback):
-                    try:
-                        self.log_callback('page', False, f'Page {page}: {e}')
-                    except Exception:
-                        pass
-            page += 1
-            time.sleep(random.uniform(2, 5))
+
+_console = None
+
+
+def console() -> Console:
+    global _console
+    if _console is None:
+        _console = Console()
+    return _console
+
+
+# بناء المحمّل من خيارات سطر الأوامر (تستخدمه العملية الرئيسية وعمليات الأجزاء)
+# كل مكوّن اختياري يُستورد فقط عند تفعيل خياره، ليبقى بدء التشغيل سريعاً
+def build_downloader(args):
+    # الزحف العادي فقط يُسجَّل في السجل؛ وضع manifest والأجزاء لهما آلياتهما الخاصة
+    crawl = not (args.manifest or args.from_catalog or args.export_manifest or args.work_queue)
+    if crawl:
+        os.makedirs(args.dir, exist_ok=True)
+    # بعد حذف الأرشيف لا يتذكر الخريطة المثبّتة إلا السجل، فيُنشأ تلقائياً مع --after-install delete
+    delete_installed = args.install_to and args.after_install == 'delete'
+    if (args.incremental or args.from_catalog or args.work_queue or delete_installed) and not args.catalog:
+        args.catalog = os.path.join(args.dir, 'catalog.sqlite3')
+    catalog = None
+    if args.catalog:
+        from cnclabs.mapcatalog import MapCatalog
+        os.makedirs(os.path.dirname(os.path.abspath(args.catalog)), exist_ok=True)
+        catalog = MapCatalog(args.catalog)
+    map_filter = MapFilter(min_rating=args.min_rating, since=args.since, until=args.until, author=args.author,
+                           max_size=int(args.max_size * 1024 * 1024) if args.max_size else None)
+    installer = None
+    if args.install_to:
+        from cnclabs.mapinstall import MapInstaller
+        installer = MapInstaller(args.install_to, workers=args.extract_workers, after=args.after_install)
+    bandwidth = None
+    if args.limit_rate or args.rate_schedule or args.rate_file:
+        from cnclabs.bandwidth import BandwidthLimiter
+        # عمليات الأجزاء المحلية تتقاسم الخط نفسه، فيُقسم الحد بينها
+        share = args.processes if args.work_queue and args.processes else 1
+        bandwidth = BandwidthLimiter(args.limit_rate, args.rate_schedule, share=share)
+    page_cache = None
+    if args.page_cache:
+        from cnclabs.pagecache import PageCache
+        page_cache = PageCache(args.page_cache, ttl=args.cache_ttl * 3600, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+    options = dict(
+        players=args.players,
+        start_page=args.start_page,
+        max_pages=args.max_pages,
+        max_workers=args.workers,
+        download_dir=args.dir,
+        catalog=catalog,
+        incremental=args.incremental,
+        page_cache=page_cache,
+        adaptive=not args.no_adaptive,
+        max_concurrency=args.max_concurrency,
+        verify=args.verify,
+        dedup=args.dedup,
+        durability=args.durability,
+        base_url=args.base_url,
+        failed_manifest=ManifestWriter(args.failed_manifest) if args.failed_manifest else None,
+        journal=CrawlJournal(args.journal or os.path.join(args.dir, 'crawl.journal'), resume=args.resume)
+        if crawl else None,
+        installer=installer,
+        details_cache=DetailsCache(args.details_cache or os.path.join(args.dir, '.details-cache'),
+                                   ttl=args.details_ttl * 3600) if args.details or map_filter.active else None,
+        map_filter=map_filter if map_filter.active else None,
+        details_workers=args.details_workers,
+        bandwidth=bandwidth,
+        order=args.order,
+        probe_sizes=args.probe_sizes,
+        log_callback=console().log,
+        progress_callback=console().progress
+    )
+    if args.engine == 'async':
+        # aiohttp is only needed for the async engine
+        from cnclabs.async_core import AsyncCnCLabsDownloader
+        return AsyncCnCLabsDownloader(limit_per_host=args.per_host, **options)
+    return CnCLabsDownloader(
+        segments=args.segments,
+        segment_threshold=int(args.segment_threshold * 1024 * 1024),
+        **options
+    )
+
+
+# مراقبة ملف التحكم بالسرعة لتغيير الحد أثناء التشغيل (مثلاً: echo 256K > rate.txt)
+def watch_rate_file(args, downloader):
+    if not args.rate_file:
+        return None
+    from cnclabs.bandwidth import RateControlFile
+    return RateControlFile(downloader.bandwidth, args.rate_file,
+                           on_error=lambda message: console().log(message, 'warning')).start()
+
+
+# عامل أجزاء: يحجز أجزاء الزحف من طابور العمل المشترك وينفذها حتى تنتهي
+def shard_worker(args):
+    from cnclabs.workqueue import WorkQueue, run_worker
+    downloader = build_downloader(args)
+    rate_file = watch_rate_file(args, downloader)
+    work_queue = WorkQueue(args.work_queue)
+    try:
+        run_worker(downloader, work_queue, lease=args.lease, log=console().log)
+    finally:
+        if rate_file is not None:
+            rate_file.stop()
+        work_queue.close()
+        if downloader.installer is not None:
+            downloader.installer.close()
+        if downloader.catalog is not None:
+            downloader.catalog.close()
+
+
+# الزحف الموزع: تقسيم الصفحات إلى أجزاء (اختياري) ثم تشغيل عمال محليين أو العمل في هذه العملية
+def run_sharded(args):
+    import multiprocessing
+    from cnclabs.workqueue import WorkQueue
+    work_queue = WorkQueue(args.work_queue)
+    if args.plan_shards:
+        added = work_queue.plan(args.players, args.start_page, args.max_pages, args.plan_shards)
+        console().log(f"[SHARD] Planned {added} new shards in {args.work_queue}", 'info')
+    if args.processes:
+        processes = [multiprocessing.Process(target=shard_worker, args=(args,), name=f'shard-worker-{i}')
+                     for i in range(args.processes)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+    else:
+        shard_worker(args)
+    console().log(f"[SHARD] Shards: {work_queue.counts()}", 'success')
+    work_queue.close()
 
 
 def main():
     parser = argparse.ArgumentParser(description="CNC Labs Map Downloader CLI")
-    parser.add_argument('-p', '--players', type=int, default=8, help="Number of players")
-    parser.add_argument('-m', '--max-pages', type=int, default=10, help="Maximum number of pages to scrape")
+    parser.add_argument('-p', '--players', type=parse_int_ranges, default=[8],
+                        help="Number of players: one value, a list or a range, e.g. 8, 2,4,8 or 2-8")
+    parser.add_argument('-m', '--max-pages', type=int, default=10, help="Last page to scrape for each player count")
+    parser.add_argument('--start-page', type=int, default=1, help="First page to scrape for each player count")
     parser.add_argument('-w', '--workers', type=int, default=3, help="Number of parallel downloads")
     parser.add_argument('-d', '--dir', type=str, default='downloads', help="Download directory")
+    parser.add_argument('-e', '--engine', choices=('threads', 'async'), default='threads',
+                        help="Download engine: thread pool or asyncio with a pooled connector")
+    parser.add_argument('--per-host', type=int, default=0,
+                        help="Async engine: max concurrent connections per host (0 = unlimited)")
+    parser.add_argument('-c', '--catalog', type=str, default=None, help="SQLite map catalog file")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Stop paging at the first page with no maps new to the catalog")
+    parser.add_argument('--from-catalog', action='store_true',
+                        help="Download pending maps recorded in the catalog without scraping")
+    parser.add_argument('--page-cache', type=str, default=None,
+                        help="Directory for the conditional-request cache of listing pages")
+    parser.add_argument('--cache-ttl', type=float, default=7 * 24, help="Page cache entry lifetime in hours")
+    parser.add_argument('--cache-max-mb', type=float, default=50, help="Page cache size cap in MB")
+    parser.add_argument('-s', '--segments', type=int, default=1,
+                        help="Threads engine: parallel connections per large archive (default: 1, single stream)")
+    parser.add_argument('--segment-threshold', type=float, default=8,
+                        help="Only split archives at least this many MB (default: 8)")
+    parser.add_argument('--max-concurrency', type=int, default=None,
+                        help="Most downloads the adaptive limiter may grow to (default: twice --workers)")
+    parser.add_argument('--no-adaptive', action='store_true',
+                        help="Disable the shared AIMD limiter and use a fixed worker count")
+    parser.add_argument('--verify', choices=('off', 'basic', 'full'), default='basic',
+                        help="Archive check after download: basic = zip directory, full = every member's CRC")
+    parser.add_argument('--dedup', choices=('off', 'link', 'skip'), default='off',
+                        help="Identical archives (by SHA-256): hardlink them, or skip storing the duplicate")
+    parser.add_argument('--durability', choices=DURABILITY, default='commit',
+                        help="fsync finished archives: commit = before and after the rename into place, off = leave it to the OS")
+    parser.add_argument('--manifest', type=str, default=None,
+                        help="Download the maps listed in a JSONL/CSV manifest instead of scraping")
+    parser.add_argument('--export-manifest', type=str, default=None,
+                        help="Dry run: scrape listing pages and write the maps to this JSONL/CSV manifest")
+    parser.add_argument('--failed-manifest', type=str, default=None,
+                        help="Write maps that fail to download to this JSONL/CSV manifest for a later retry")
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="With --manifest/--from-catalog: only download shard K of N (e.g. 2/3)")
+    parser.add_argument('--work-queue', type=str, default=None,
+                        help="Sharded crawl: SQLite work queue shared by all worker processes/machines")
+    parser.add_argument('--plan-shards', type=int, default=None, metavar='PAGES',
+                        help="Split -p/--start-page/-m into shards of this many pages and add them to --work-queue")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="Sharded crawl: local worker processes to start (0 = work in this process)")
+    parser.add_argument('--lease', type=float, default=300,
+                        help="Seconds a claimed shard stays reserved without a heartbeat before it is reassigned")
+    parser.add_argument('--journal', type=str, default=None,
+                        help="Crawl journal file (default: <dir>/crawl.journal)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Replay the journal of an interrupted crawl: skip fetched pages, retry unfinished maps")
+    parser.add_argument('--details', action='store_true',
+                        help="Fetch each map's details page for author, rating, upload date, description, "
+                             "preview and size (implied by the filters below)")
+    parser.add_argument('--details-cache', type=str, default=None,
+                        help="Directory for parsed details pages (default: <dir>/.details-cache)")
+    parser.add_argument('--details-ttl', type=float, default=30 * 24, help="Details cache entry lifetime in hours")
+    parser.add_argument('--details-workers', type=int, default=4, help="Details pages fetched in parallel")
+    parser.add_argument('--min-rating', type=float, default=None, help="Only download maps rated at least this")
+    parser.add_argument('--since', type=iso_date, default=None, metavar='YYYY-MM-DD',
+                        help="Only download maps uploaded on or after this date")
+    parser.add_argument('--until', type=iso_date, default=None, metavar='YYYY-MM-DD',
+                        help="Only download maps uploaded on or before this date")
+    parser.add_argument('--author', type=str, default=None, help="Only download maps whose author contains this text")
+    parser.add_argument('--max-size', type=float, default=None, help="Only download maps listed at most this many MB")
+    parser.add_argument('--order', choices=ORDERS, default='page',
+                        help="Which queued map downloads next: page order (default), smallest archive, shortest "
+                             "expected transfer (eta) or newest upload. A manifest's 'priority' column comes first")
+    parser.add_argument('--probe-sizes', action='store_true',
+                        help="HEAD-request archives whose size no manifest, catalog or details page gave, "
+                             "for --order smallest/eta")
+    parser.add_argument('--install-to', type=str, default=None, metavar='MAPS_DIR',
+                        help="Unpack each map into this folder (the game's Maps folder) as soon as it is downloaded")
+    parser.add_argument('--extract-workers', type=int, default=2, help="Threads unpacking archives (default: 2)")
+    parser.add_argument('--after-install', choices=('keep', 'delete'), default='keep',
+                        help="What to do with an archive once it is unpacked")
+    parser.add_argument('--limit-rate', type=parse_rate, default=0, metavar='RATE',
+                        help="Total download bandwidth for all workers, e.g. 512K or 2M per second (0 = unlimited)")
+    parser.add_argument('--rate-schedule', type=BandwidthSchedule, default=None, metavar='SPEC',
+                        help="Bandwidth by time of day, first match wins, e.g. '08:00-18:00=512K,*=0'; "
+                             "--limit-rate applies outside the windows")
+    parser.add_argument('--rate-file', type=str, default=None, metavar='PATH',
+                        help="Change the bandwidth while running: write a rate or a schedule to this file")
+    parser.add_argument('--base-url', type=str, default=None,
+                        help="Site to crawl instead of https://www.cnclabs.com (e.g. a local stub server)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+    parser.add_argument('--metrics-file', type=str, default=None,
+                        help="Write a JSON metrics snapshot to this file periodically and at exit")
+    parser.add_argument('--metrics-interval', type=float, default=10, help="Seconds between JSON metrics dumps")
     args = parser.parse_args()
 
-    downloader = CnCLabsDownloader(
-        players=args.players,
-        max_pages=args.max_pages,
-        max_workers=args.workers,
-        download_dir=args.dir
-    )
-    downloader.download_all_maps()
+    if args.work_queue:
+        run_sharded(args)
+        return
+    downloader = build_downloader(args)
+    catalog = downloader.catalog
+    rate_file = watch_rate_file(args, downloader)
+    if args.metrics_port is not None:
+        from cnclabs.metrics import serve_metrics
+        serve_metrics(downloader.metrics, port=args.metrics_port)
+    dumper = None
+    if args.metrics_file:
+        from cnclabs.metrics import MetricsDumper
+        dumper = MetricsDumper(downloader.metrics, args.metrics_file, args.metrics_interval).start()
+    try:
+        if args.manifest or args.from_catalog:
+            if args.manifest:
+                maps_list = read_manifest(args.manifest)
+                if catalog is not None:
+                    catalog.record_seen([m for m in maps_list if m.get('DetailsUrl')])
+            else:
+                maps_list = catalog.pending_maps(players=args.players)
+            if args.shard:
+                maps_list = select_shard(maps_list, *args.shard)
+            maps_list = downloader.select_maps(maps_list)
+            if args.export_manifest:
+                # تصدير القائمة (مثلاً الخرائط الفاشلة من الفهرس) دون تحميل
+                with ManifestWriter(args.export_manifest) as writer:
+                    for m in maps_list:
+                        writer.put(m)
+                console().log(f"[INFO] Wrote {writer.count} maps to {args.export_manifest}", 'success')
+            else:
+                downloader.download_maps(maps_list)
+        elif args.export_manifest:
+            count = downloader.export_manifest(args.export_manifest)
+            console().log(f"[INFO] Wrote {count} maps to {args.export_manifest}", 'success')
+        else:
+            downloader.download_all_maps()
+    finally:
+        if rate_file is not None:
+            rate_file.stop()
+        if dumper is not None:
+            dumper.stop()
+        if downloader.failed_manifest is not None:
+            downloader.failed_manifest.close()
+        if downloader.journal is not None:
+            downloader.journal.close()
+        if downloader.installer is not None:
+            downloader.installer.close()
 
 
 if __name__ == "__main__":
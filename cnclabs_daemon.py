@@ -0,0 +1,614 @@
+"""Headless download service: one warm CnCLabsDownloader behind a local HTTP/JSON API.
+
+    python cnclabs_daemon.py --port 8770 -d downloads
+
+Endpoints (JSON in and out):
+
+    GET    /status           queue depth, active downloads, concurrency limit, connection reuse, job counts
+    GET    /jobs             every job with its counters
+    POST   /jobs             {"type": "crawl", "players": "2-8", "start_page": 1, "max_pages": 10, "incremental": false}
+                             {"type": "maps", "urls": ["https://www.cnclabs.com/.../details.aspx?id=123", ...]}
+                             either may add "priority": 5 (higher first, default 0)
+    GET    /jobs/<id>        one job
+    DELETE /jobs/<id>        cancel: stop paging, drop its queued maps (transfers in flight finish)
+    GET    /bandwidth        base rate, schedule and the rate in force (bytes per second, 0 = unlimited)
+    PUT    /bandwidth        {"rate": "512K"} and/or {"schedule": "08:00-18:00=512K,*=0"} (null clears it)
+    GET    /events[?job=id]  Server-Sent Events stream of job, map and progress events
+    GET    /metrics          Prometheus text metrics
+
+The session, limiter, catalog and page cache live for the whole process, so every request reuses
+pooled connections and the same adaptive concurrency state and bandwidth limiter.
+"""
+import argparse
+import contextvars
+import http.server
+import itertools
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from cnclabs.bandwidth import BandwidthLimiter, BandwidthSchedule, parse_rate
+from cnclabs.core import CnCLabsDownloader
+from cnclabs.crawlplan import CrawlScheduler, parse_int_ranges
+from cnclabs.mapcatalog import MapCatalog
+from cnclabs.mapqueue import ORDERS, MapQueue
+from cnclabs.pagecache import PageCache
+from cnclabs.streamio import DURABILITY
+
+# Job the current download belongs to; segment threads inherit it through copied contexts
+current_job = contextvars.ContextVar('current_job', default=None)
+
+
+class Job:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, job_id: int, kind: str, params: dict):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = self.QUEUED
+        self.created = time.time()
+        self.finished = None
+        self.queued = 0
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.feeding = True
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def pending(self) -> int:
+        return self.queued - self.ok - self.failed - self.skipped
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id, 'type': self.kind, 'params': self.params, 'status': self.status,
+            'created': self.created, 'finished': self.finished, 'queued': self.queued,
+            'ok': self.ok, 'failed': self.failed, 'skipped': self.skipped, 'pending': self.pending,
+        }
+
+
+class EventHub:
+    """Fan-out of service events to SSE subscribers; a slow client loses events instead of blocking workers."""
+
+    def __init__(self, backlog: int = 1000):
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, kind: str, **data):
+        event = (kind, dict(data, time=time.time()))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+class ServiceDownloader(CnCLabsDownloader):
+    """CnCLabsDownloader that reports progress and limit changes as events instead of a terminal bar."""
+
+    def __init__(self, events: EventHub, **kwargs):
+        # PUT /bandwidth can limit a service started without a limit, so there is always a limiter
+        kwargs['bandwidth'] = kwargs.get('bandwidth') or BandwidthLimiter()
+        super().__init__(**kwargs)
+        self.events = events
+        self._last_percent = {}
+        self._progress_lock = threading.Lock()
+
+    def report_progress(self, name, downloaded, total):
+        if total <= 0:
+            return
+        job = current_job.get()
+        percent = int(min(100, downloaded * 100 / total))
+        key = (job.id if job else None, name)
+        # Only whole-percent changes become events
+        with self._progress_lock:
+            if self._last_percent.get(key) == percent:
+                return
+            self._last_percent[key] = percent
+        self.events.publish('progress', job=key[0], map=name, percent=percent, bytes=downloaded, total=total)
+
+    def progress_done(self, name: str):
+        job = current_job.get()
+        with self._progress_lock:
+            self._last_percent.pop((job.id if job else None, name), None)
+
+    def on_limit_change(self, old: int, new: int):
+        super().on_limit_change(old, new)
+        self.events.publish('limit', old=old, new=new)
+
+    def on_bandwidth_change(self, old: int, new: int):
+        super().on_bandwidth_change(old, new)
+        self.events.publish('bandwidth', old=old, new=new)
+
+
+class DownloadService:
+    """Long-lived job scheduler around one downloader.
+
+    Crawl jobs run one at a time on a crawler thread, which keeps listing requests polite. URL jobs
+    get their details pages and size probes on a resolver thread, so submitting never waits on the
+    site. The maps of both go to one queue drained by ``pool_size`` workers. Each worker holds a
+    limiter slot for the whole transfer, exactly like the one-shot engines. The queue serves a
+    higher job priority first, then follows the downloader's order.
+    """
+
+    def __init__(self, downloader: ServiceDownloader, events: EventHub):
+        self.downloader = downloader
+        self.events = events
+        self.jobs = {}
+        self.maps = MapQueue(order=downloader.order, cost=downloader.expected_cost, unpack=lambda item: item[1])
+        self.crawls = queue.Queue()
+        self.lookups = queue.Queue()
+        self.active = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        self.downloader.metrics.queue_depth.set_function(self.maps.qsize)
+        self._threads.append(threading.Thread(target=self.feed_loop, args=(self.crawls, self.crawl),
+                                              name='crawler', daemon=True))
+        self._threads.append(threading.Thread(target=self.feed_loop, args=(self.lookups, self.resolve),
+                                              name='resolver', daemon=True))
+        for i in range(self.downloader.pool_size):
+            self._threads.append(threading.Thread(target=self.download_loop, name=f'worker-{i}', daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self.crawls.put(None)
+        self.lookups.put(None)
+        for _ in range(self.downloader.pool_size):
+            self.maps.put(None)
+
+    # ---- jobs ----
+
+    def submit(self, spec: dict) -> Job:
+        kind = spec.get('type')
+        try:
+            priority = int(spec.get('priority', 0))
+        except (TypeError, ValueError):
+            raise ValueError("'priority' must be an integer")
+        if kind == 'crawl':
+            players = spec.get('players', 8)
+            params = {
+                'players': parse_int_ranges(','.join(map(str, players)) if isinstance(players, list) else players),
+                'start_page': int(spec.get('start_page', 1)),
+                'max_pages': int(spec.get('max_pages', self.downloader.max_pages)),
+                'incremental': bool(spec.get('incremental', False)),
+                'priority': priority,
+            }
+            job = self.new_job(kind, params)
+            self.crawls.put(job)
+        elif kind == 'maps':
+            urls = spec.get('urls')
+            if not urls or not isinstance(urls, list):
+                raise ValueError("'urls' must be a non-empty list")
+            for u in urls:
+                self.map_id_from_url(u)
+            # Details pages and HEAD probes may back off for minutes; the resolver thread does them
+            job = self.new_job(kind, {'urls': urls, 'priority': priority})
+            self.lookups.put(job)
+        else:
+            raise ValueError("'type' must be 'crawl' or 'maps'")
+        return job
+
+    def new_job(self, kind: str, params: dict) -> Job:
+        with self._lock:
+            job = Job(next(self._ids), kind, params)
+            self.jobs[job.id] = job
+        self.events.publish('job', **job.to_dict())
+        return job
+
+    def cancel(self, job: Job):
+        with self._lock:
+            if job.status in (Job.DONE, Job.CANCELLED):
+                return
+            job.cancel_event.set()
+        self.events.publish('job', **job.to_dict())
+
+    def enqueue(self, job: Job, maps_list: list):
+        with self._lock:
+            job.queued += len(maps_list)
+            if job.status == Job.QUEUED:
+                job.status = Job.RUNNING
+        priority = job.params.get('priority')
+        for m in maps_list:
+            self.maps.put((job, {**m, 'Priority': priority} if priority else m))
+
+    # The producer side is finished; the job completes once its last queued map is accounted for
+    def feed_done(self, job: Job):
+        with self._lock:
+            job.feeding = False
+        self.maybe_finish(job)
+
+    def maybe_finish(self, job: Job):
+        with self._lock:
+            if job.feeding or job.pending or job.finished:
+                return
+            job.status = Job.CANCELLED if job.cancelled else Job.DONE
+            job.finished = time.time()
+        self.events.publish('job', **job.to_dict())
+
+    @staticmethod
+    def map_id_from_url(url) -> str:
+        parsed = urlparse(url) if isinstance(url, str) else None
+        if parsed is None or not parsed.scheme or 'id' not in parse_qs(parsed.query):
+            raise ValueError(f"Not a map details/fetch URL: {url}")
+        return parse_qs(parsed.query)['id'][0]
+
+    # A map the catalog knows keeps its real name and player count; only unknown ones get placeholders
+    def map_from_url(self, url: str) -> dict:
+        map_id = self.map_id_from_url(url)
+        details_url = url.replace('fetch', 'details')
+        catalog = self.downloader.catalog
+        row = catalog.get(details_url) if catalog is not None else None
+        if row is not None:
+            return catalog.row_to_map(row)
+        return {
+            'Name': f"map-{map_id}",
+            'Players': None,
+            'DetailsUrl': details_url,
+            'DownloadUrl': url.replace('details', 'fetch'),
+        }
+
+    # ---- workers ----
+
+    # Runs the jobs of one queue one at a time; ``build`` feeds a job's maps to the download queue
+    def feed_loop(self, jobs: queue.Queue, build):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            try:
+                if not job.cancelled:
+                    build(job)
+            except Exception as e:
+                self.events.publish('error', job=job.id, message=str(e))
+            finally:
+                self.feed_done(job)
+
+    def resolve(self, job: Job):
+        d = self.downloader
+        maps_list = [self.map_from_url(u) for u in job.params['urls']]
+        if d.catalog is not None:
+            d.catalog.record_unlisted(maps_list)
+        maps_list = d.select_maps(maps_list)
+        if not job.cancelled:
+            self.enqueue(job, maps_list)
+
+    def crawl(self, job: Job):
+        d = self.downloader
+        params = job.params
+        scheduler = CrawlScheduler(params['players'], params['start_page'], params['max_pages'])
+        crawl_started = time.time()
+        with self._lock:
+            job.status = Job.RUNNING
+        self.events.publish('job', **job.to_dict())
+        first = True
+        while not job.cancelled:
+            nxt = scheduler.next_page()
+            if nxt is None:
+                break
+            players, page = nxt
+            # Politeness delay between listing fetches; cancelling cuts it short
+            if not first:
+                delay = random.uniform(2, 5)
+                delay_started = time.monotonic()
+                cancelled = job.cancel_event.wait(delay)
+                d.metrics.sleep_seconds.labels('page_delay').inc(time.monotonic() - delay_started)
+                if cancelled:
+                    break
+            first = False
+            more = True
+            try:
+                maps_list = d.scrape_page(page, players)
+                more = bool(maps_list)
+                if d.catalog is not None and maps_list:
+                    new_maps = d.catalog.record_seen(maps_list, since=crawl_started)
+                    more = not (params['incremental'] and not new_maps)
+                fresh = d.select_maps(scheduler.unseen(maps_list))
+                self.events.publish('page', job=job.id, players=players, page=page, maps=len(fresh))
+                self.enqueue(job, fresh)
+            except Exception as e:
+                self.events.publish('error', job=job.id, message=f"Page {page} ({players}P): {e}")
+            scheduler.page_done(players, page, more)
+
+    def download_loop(self):
+        d = self.downloader
+        while True:
+            item = self.maps.get()
+            if item is None:
+                return
+            job, m = item
+            if job.cancelled:
+                with self._lock:
+                    job.skipped += 1
+                self.maybe_finish(job)
+                continue
+            with self._lock:
+                self.active += 1
+            name, ok, msg = m['Name'], False, ''
+            token = current_job.set(job)
+            try:
+                with d.request_slot():
+                    name, ok, msg = d.download_map(m)
+                d.progress_done(name)
+            except Exception as e:
+                msg = str(e)
+            finally:
+                current_job.reset(token)
+                with self._lock:
+                    self.active -= 1
+                    if ok:
+                        job.ok += 1
+                    else:
+                        job.failed += 1
+            self.events.publish('map', job=job.id, map=name, ok=ok, detail=msg)
+            self.maybe_finish(job)
+
+    def status(self) -> dict:
+        d = self.downloader
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            active = self.active
+        return {
+            'queued_maps': self.maps.qsize(),
+            'queued_crawls': self.crawls.qsize(),
+            'queued_lookups': self.lookups.qsize(),
+            'active_downloads': active,
+            'workers': d.pool_size,
+            'limit': d.limiter.current if d.limiter is not None else d.max_workers,
+            'bandwidth': d.bandwidth.effective,
+            'order': d.order,
+            'connections': d.metrics.connection_reuse(),
+            'jobs': counts,
+        }
+
+    # Both keys are optional; a bad value changes nothing
+    def set_bandwidth(self, spec: dict) -> dict:
+        limiter = self.downloader.bandwidth
+        rate = parse_rate(spec['rate']) if 'rate' in spec else None
+        schedule = spec.get('schedule')
+        if schedule:
+            schedule = BandwidthSchedule(str(schedule))
+        if 'schedule' in spec:
+            limiter.set_schedule(schedule)
+        if rate is not None:
+            limiter.set_rate(rate)
+        return limiter.status()
+
+
+class ServiceHandler(http.server.BaseHTTPRequestHandler):
+    service = None
+    SSE_KEEPALIVE = 15.0
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        data = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        return data
+
+    def find_job(self, path: str):
+        try:
+            return self.service.jobs.get(int(path.rsplit('/', 1)[1]))
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/status':
+            self.send_json(self.service.status())
+        elif url.path == '/metrics':
+            body = self.service.downloader.metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == '/bandwidth':
+            self.send_json(self.service.downloader.bandwidth.status())
+        elif url.path == '/jobs':
+            self.send_json([job.to_dict() for job in list(self.service.jobs.values())])
+        elif url.path.startswith('/jobs/'):
+            job = self.find_job(url.path)
+            if job is None:
+                self.send_json({'error': 'no such job'}, 404)
+            else:
+                self.send_json(job.to_dict())
+        elif url.path == '/events':
+            job_id = parse_qs(url.query).get('job', [None])[0]
+            if job_id:
+                try:
+                    job_id = int(job_id)
+                except ValueError:
+                    self.send_json({'error': 'job must be an integer id'}, 400)
+                    return
+                if job_id not in self.service.jobs:
+                    self.send_json({'error': 'no such job'}, 404)
+                    return
+            self.stream_events(job_id or None)
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/jobs':
+            self.send_json({'error': 'not found'}, 404)
+            return
+        try:
+            job = self.service.submit(self.read_json())
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        self.send_json(job.to_dict(), 201)
+
+    def do_PUT(self):
+        if urlparse(self.path).path != '/bandwidth':
+            self.send_json({'error': 'not found'}, 404)
+            return
+        try:
+            status = self.service.set_bandwidth(self.read_json())
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        self.send_json(status)
+
+    def do_DELETE(self):
+        path = urlparse(self.path).path
+        job = self.find_job(path) if path.startswith('/jobs/') else None
+        if job is None:
+            self.send_json({'error': 'no such job'}, 404)
+            return
+        self.service.cancel(job)
+        self.send_json(job.to_dict())
+
+    def stream_events(self, job_id):
+        hub = self.service.events
+        q = hub.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            while True:
+                try:
+                    kind, data = q.get(timeout=self.SSE_KEEPALIVE)
+                except queue.Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+                    continue
+                if job_id is not None and data.get('job', data.get('id')) != job_id:
+                    continue
+                self.wfile.write(f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            hub.unsubscribe(q)
+
+
+class ServiceServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    # SSE clients disconnect whenever they like
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_service(downloader_options: dict, host: str = '127.0.0.1', port: int = 8770):
+    """Start the workers and the HTTP server; returns (server, service). ``port=0`` picks a free port."""
+    events = EventHub()
+    service = DownloadService(ServiceDownloader(events, **downloader_options), events)
+    service.start()
+    handler = type('ConfiguredServiceHandler', (ServiceHandler,), {'service': service})
+    server = ServiceServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CNC Labs map downloader service with a local HTTP/JSON API")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=8770, help="Port to listen on")
+    parser.add_argument('-d', '--dir', type=str, default='downloads', help="Download directory")
+    parser.add_argument('-w', '--workers', type=int, default=3, help="Number of parallel downloads")
+    parser.add_argument('-m', '--max-pages', type=int, default=10, help="Default last page for crawl jobs")
+    parser.add_argument('--max-concurrency', type=int, default=None,
+                        help="Most downloads the adaptive limiter may grow to (default: twice --workers)")
+    parser.add_argument('--no-adaptive', action='store_true',
+                        help="Disable the shared AIMD limiter and use a fixed worker count")
+    parser.add_argument('-s', '--segments', type=int, default=1, help="Parallel connections per large archive")
+    parser.add_argument('--verify', choices=('off', 'basic', 'full'), default='basic',
+                        help="Archive check after download: basic = zip directory, full = every member's CRC")
+    parser.add_argument('--dedup', choices=('off', 'link', 'skip'), default='off',
+                        help="Identical archives (by SHA-256): hardlink them, or skip storing the duplicate")
+    parser.add_argument('--durability', choices=DURABILITY, default='commit',
+                        help="fsync finished archives: commit = before and after the rename into place, off = leave it to the OS")
+    parser.add_argument('--limit-rate', type=parse_rate, default=0, metavar='RATE',
+                        help="Total download bandwidth, e.g. 512K or 2M per second (0 = unlimited); see PUT /bandwidth")
+    parser.add_argument('--rate-schedule', type=BandwidthSchedule, default=None, metavar='SPEC',
+                        help="Bandwidth by time of day, e.g. '08:00-18:00=512K,*=0'")
+    parser.add_argument('--order', choices=ORDERS, default='page',
+                        help="Which queued map downloads next (after job priority): page order, smallest archive, "
+                             "shortest expected transfer or newest upload")
+    parser.add_argument('--probe-sizes', action='store_true',
+                        help="HEAD-request archives whose size is unknown, for --order smallest/eta")
+    parser.add_argument('--base-url', type=str, default=None,
+                        help="Site to crawl instead of https://www.cnclabs.com (e.g. a local stub server)")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    catalog = MapCatalog(os.path.join(args.dir, 'catalog.sqlite3'))
+    options = dict(
+        max_pages=args.max_pages,
+        max_workers=args.workers,
+        download_dir=args.dir,
+        catalog=catalog,
+        page_cache=PageCache(os.path.join(args.dir, '.page-cache')),
+        segments=args.segments,
+        adaptive=not args.no_adaptive,
+        max_concurrency=args.max_concurrency,
+        verify=args.verify,
+        dedup=args.dedup,
+        durability=args.durability,
+        base_url=args.base_url,
+        bandwidth=BandwidthLimiter(args.limit_rate, args.rate_schedule),
+        order=args.order,
+        probe_sizes=args.probe_sizes,
+        log_callback=lambda message, level: print(message, flush=True)
+    )
+    server, service = start_service(options, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        service.stop()
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import threading
+import time
+
+
+class EventBus:
+    """Thread-safe hand-off of log lines and progress updates from worker threads to the Tk main loop.
+
+    Workers only append to in-memory buffers under a lock; the UI thread calls ``drain`` on a timer and
+    applies everything that accumulated since the last tick in one go. Progress is coalesced per map,
+    so a worker reporting every chunk costs one dict assignment, not one widget update.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._logs = []
+        self._progress = {}
+        self._calls = []
+
+    def log(self, message: str, level: str = "info"):
+        entry = (time.strftime("%H:%M:%S"), message, level)
+        with self._lock:
+            self._logs.append(entry)
+
+    def progress(self, map_name: str, percent: float):
+        with self._lock:
+            self._progress[map_name] = percent
+
+    # Run a callable on the UI thread at the next drain (widget updates from worker threads)
+    def call_soon(self, fn, *args):
+        with self._lock:
+            self._calls.append((fn, args))
+
+    def drain(self):
+        """Return (log entries, latest progress per map, pending calls) and reset the buffers."""
+        with self._lock:
+            logs, self._logs = self._logs, []
+            progress, self._progress = self._progress, {}
+            calls, self._calls = self._calls, []
+        return logs, progress, calls
@@ -0,0 +1,61 @@
+import tkinter as tk
+
+
+class LogView:
+    """Bounded log on top of a Tk Text widget.
+
+    The widget never holds more than ``max_lines`` lines: the oldest are deleted in blocks of
+    ``trim_slack`` once the limit is exceeded, so memory and redraw cost stay flat however long a run
+    goes. An optional log file still receives every line. Levels are filtered by eliding their tag,
+    which hides existing text without re-inserting anything.
+    """
+    LEVELS = ("success", "error", "warning", "info")
+
+    def __init__(self, text: tk.Text, max_lines: int = 2000, trim_slack: int = 200):
+        self.text = text
+        self.max_lines = max_lines
+        self.trim_slack = trim_slack
+        self.log_file = None
+
+    def open_file(self, path: str):
+        self.close_file()
+        self.log_file = open(path, 'a', encoding='utf-8', buffering=64 * 1024)
+
+    def close_file(self):
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
+    def clear(self):
+        self.text.delete("1.0", tk.END)
+
+    # entries: (timestamp, message, level) tuples as produced by EventBus.drain
+    def append(self, entries):
+        if not entries:
+            return
+        at_bottom = self.text.yview()[1] >= 0.999
+        # One insert per run of same-level lines instead of one per line
+        batch = []
+        batch_level = None
+        for timestamp, message, level in entries:
+            if level != batch_level and batch:
+                self.text.insert(tk.END, "".join(batch), batch_level)
+                batch = []
+            batch_level = level
+            batch.append(f"[{timestamp}] {message}\n")
+        if batch:
+            self.text.insert(tk.END, "".join(batch), batch_level)
+        if self.log_file:
+            self.log_file.write("".join(f"[{t}] [{level.upper()}] {m}\n" for t, m, level in entries))
+        self.trim()
+        # Don't yank the view away from someone reading older lines
+        if at_bottom:
+            self.text.see(tk.END)
+
+    def trim(self):
+        lines = int(self.text.index("end-1c").split(".")[0])
+        if lines > self.max_lines + self.trim_slack:
+            self.text.delete("1.0", f"{lines - self.max_lines + 1}.0")
+
+    def set_visible(self, level: str, visible: bool):
+        self.text.tag_config(level, elide=not visible)